@@ -1,54 +1,176 @@
-from flask import Flask, render_template, redirect, request, session, flash, url_for
+from flask import Flask, render_template, redirect, request, session, flash, url_for, g, has_app_context, has_request_context, abort, make_response, Response, stream_with_context, jsonify
+from flask import before_render_template, template_rendered, send_from_directory
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, func, insert, select, tuple_
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.schema import CreateTable
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from werkzeug.security import check_password_hash, generate_password_hash
+from werkzeug.utils import safe_join
 import os
-from datetime import datetime , timedelta
+import io
+import sqlite3
+import csv
+import json
+import re
+import base64
+import hashlib
+import hmac
+import gzip
+import shutil
+import mimetypes
+import threading
+import click
+import random
+import bisect
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from datetime import datetime , timedelta, timezone
 #orm means object relational mapping between python and database
-import seaborn as sns
-import matplotlib
-matplotlib.use('Agg')  # Corrected here
-import matplotlib.pyplot as plt
 
 
 
 curr_dir = os.path.dirname(os.path.abspath(__file__))
 
+class Quizmaster(Flask):
+    def send_static_file(self, filename):
+        # The static route serves fingerprinted and precompressed files, see serve_static
+        return serve_static(filename)
+
 # Initialize Flask app
-app = Flask(__name__)
-app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///quizmaster.sqlite3"
+app = Quizmaster(__name__)
+app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("QUIZMASTER_DATABASE_URI", "sqlite:///quizmaster.sqlite3")
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 app.config["SECRET_KEY"] = "PROJECT_SECRET_KEY"
 app.config["UPLOAD_FOLDER"]= os.path.join(curr_dir, "static", "imgs")
+# Max SQL statements a single request may issue (None disables the check).
+# Going over the budget logs a warning, or raises when testing / strict mode is on.
+app.config["SQL_QUERY_BUDGET"] = None
+app.config["SQL_QUERY_BUDGET_STRICT"] = False
+# Summary charts are drawn in a small dedicated pool; when it is full, chart requests get a 503
+app.config["CHART_RENDER_WORKERS"] = 2
+app.config["CHART_RENDER_QUEUE"] = 4
+app.config["CHART_RENDER_TIMEOUT"] = 30
+# Passwords are stored as werkzeug hashes; the method string carries the cost, e.g.
+# "scrypt:32768:8:1" (n, r, p) or "pbkdf2:sha256:600000". Hashes are checked in a pool of
+# PASSWORD_HASH_WORKERS threads with at most PASSWORD_HASH_QUEUE sign-ins in flight; past that,
+# logins get a 503. Rows hashed with another method, or still in plain text, are rehashed at login.
+app.config["PASSWORD_HASH_METHOD"] = os.environ.get("QUIZMASTER_PASSWORD_HASH", "scrypt:32768:8:1")
+app.config["PASSWORD_HASH_WORKERS"] = int(os.environ.get("QUIZMASTER_PASSWORD_HASH_WORKERS", 4))
+app.config["PASSWORD_HASH_QUEUE"] = 64
+app.config["PASSWORD_HASH_TIMEOUT"] = 30
+# Seconds a compiled answer key or rendered quiz body may be reused before it is rebuilt
+app.config["QUIZ_CACHE_TTL"] = 60
+# Bulk question import commits every IMPORT_BATCH_SIZE rows and reports at most IMPORT_MAX_ERRORS bad rows
+app.config["IMPORT_BATCH_SIZE"] = 1000
+app.config["IMPORT_MAX_ERRORS"] = 20
+app.config["SEARCH_PAGE_SIZE"] = 20
+# Listings are paged by cursor; ?per_page= can lower or raise the size up to MAX_PAGE_SIZE
+app.config["PAGE_SIZE"] = 25
+app.config["MAX_PAGE_SIZE"] = 100
+# Submissions arriving this long after an attempt's deadline are still accepted (network, auto-submit)
+app.config["SUBMIT_GRACE_SECONDS"] = 60
+# Attempts still open after the grace period are graded from their saved answers, this many
+# per transaction, by a background check every EXPIRED_ATTEMPTS_INTERVAL seconds
+app.config["EXPIRED_ATTEMPTS_BATCH"] = 200
+app.config["EXPIRED_ATTEMPTS_INTERVAL"] = 30
+app.config["AUTOSAVE_FLUSH_INTERVAL"] = 2
+app.config["AUTOSAVE_FLUSH_SIZE"] = 500
+# Under asgi.py, routes without an async view run on a pool of this many threads
+app.config["ASGI_WSGI_THREADS"] = int(os.environ.get("QUIZMASTER_ASGI_WSGI_THREADS", 16))
+app.config["ANALYTICS_MAX_QUIZZES"] = 50
+app.config["ANALYTICS_TREND_BUCKETS"] = 12
+# Scores read per transaction by the item-stats batch job
+app.config["ITEM_STATS_BATCH"] = 50000
+app.config["LEADERBOARD_SIZE"] = 10
+# Subtrees holding more than BACKGROUND_DELETE_THRESHOLD scores are deleted by a background
+# thread, DELETE_CHUNK_SIZE scores per transaction, so other writers get in between chunks
+app.config["BACKGROUND_DELETE_THRESHOLD"] = 20000
+app.config["DELETE_CHUNK_SIZE"] = 5000
+# Seconds a starting worker waits for another one's schema migration to finish
+app.config["MIGRATION_LOCK_TIMEOUT"] = 600
+# Storage mode: "default" keeps SQLite's stock settings; "production" switches to WAL so readers
+# no longer block on the writer, relaxes fsyncs to commit points and sizes the connection pool.
+# Both enforce foreign keys, which the ON DELETE CASCADE subtree deletes rely on.
+app.config["STORAGE_MODE"] = os.environ.get("QUIZMASTER_STORAGE_MODE", "default")
+app.config["SQLITE_PRAGMAS"] = {"foreign_keys": "ON"}
+if app.config["STORAGE_MODE"] == "production":
+    app.config["SQLITE_PRAGMAS"] = {
+        "foreign_keys": "ON",
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 10000,
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -16000,
+    }
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        "pool_size": int(os.environ.get("QUIZMASTER_POOL_SIZE", 10)),
+        "max_overflow": 10,
+        "pool_timeout": 30,
+        "connect_args": {"timeout": 10},
+    }
+
+# Write-behind score ingestion: submissions are queued on local disk and flushed in batches
+app.config["SCORE_WRITE_BEHIND"] = os.environ.get("QUIZMASTER_SCORE_WRITE_BEHIND") == "1"
+app.config["SCORE_QUEUE_PATH"] = os.environ.get("QUIZMASTER_SCORE_QUEUE_PATH", os.path.join(app.instance_path, "score_queue.sqlite3"))
+app.config["SCORE_QUEUE_BATCH"] = 500
+app.config["SCORE_QUEUE_INTERVAL"] = 0.5
+# Request metrics on /metrics (Prometheus text format). PROFILE_SAMPLE_RATE is the share of
+# requests run under cProfile (or pyinstrument when PROFILER = "pyinstrument"); each profiled
+# request leaves a file in PROFILE_DIR. Profiling is off unless the rate is raised.
+app.config["METRICS_ENABLED"] = True
+app.config["PROFILE_SAMPLE_RATE"] = float(os.environ.get("QUIZMASTER_PROFILE_SAMPLE_RATE", 0))
+app.config["PROFILER"] = os.environ.get("QUIZMASTER_PROFILER", "cprofile")
+app.config["PROFILE_DIR"] = os.environ.get("QUIZMASTER_PROFILE_DIR", os.path.join(app.instance_path, "profiles"))
+# Static files: `flask build-assets` copies static/ into static/dist/ under content-hashed names,
+# precompresses the text assets and writes a manifest that url_for('static', ...) follows.
+# Hashed files are cached for STATIC_MAX_AGE seconds. Dynamic HTML/JSON/text responses of at
+# least COMPRESS_MIN_SIZE bytes are gzipped when the client accepts it.
+app.config["STATIC_DIST"] = "dist"
+app.config["STATIC_MAX_AGE"] = 365 * 86400
+app.config["COMPRESS_MIN_SIZE"] = 1024
+app.config["COMPRESS_LEVEL"] = 6
+app.config["COMPRESS_MIMETYPES"] = ("text/html", "application/json", "text/plain", "text/csv")
 
 # Initialize database
 db = SQLAlchemy(app)
 
+@event.listens_for(Engine, "connect")
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        for name, value in app.config["SQLITE_PRAGMAS"].items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
+
 # Models
 class Users(db.Model):
     __tablename__ = 'users'
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(80), nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
-    password = db.Column(db.String(128), nullable=False)
+    password = db.Column(db.String(256), nullable=False)
     qualification = db.Column(db.String(120), nullable=False)
     dob = db.Column(db.Date, nullable=False)
     is_admin = db.Column(db.Boolean, nullable=False, default=False)
-    scores = db.relationship('Scores', back_populates='user', cascade='all, delete-orphan')
+    scores = db.relationship('Scores', back_populates='user', cascade='all, delete-orphan', passive_deletes=True)
 
 class Subjects(db.Model):
     __tablename__ = 'subjects'
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(80), unique=True, nullable=False)
     description = db.Column(db.String(120), nullable=False)
-    chapters = db.relationship('Chapters', back_populates='subject', cascade='all, delete-orphan')
+    chapters = db.relationship('Chapters', back_populates='subject', cascade='all, delete-orphan', passive_deletes=True)
 
 class Chapters(db.Model):
     __tablename__ = 'chapters'
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(80), nullable=False)
     description = db.Column(db.String(120), nullable=False)
-    subject_id = db.Column(db.Integer, db.ForeignKey('subjects.id'), nullable=False)
+    subject_id = db.Column(db.Integer, db.ForeignKey('subjects.id', ondelete='CASCADE'), nullable=False, index=True)
     subject = db.relationship('Subjects', back_populates='chapters')
-    quizzes = db.relationship('Quizzes', back_populates='chapter', cascade='all, delete-orphan')
+    quizzes = db.relationship('Quizzes', back_populates='chapter', cascade='all, delete-orphan', passive_deletes=True)
 
 class Quizzes(db.Model):
     __tablename__ = 'quizzes'
@@ -57,10 +179,10 @@ class Quizzes(db.Model):
     date_of_quiz = db.Column(db.Date, nullable=False)
     time_duration = db.Column(db.Integer, nullable=False)
     remarks = db.Column(db.String(120), nullable=False)
-    chapter_id = db.Column(db.Integer, db.ForeignKey("chapters.id"), nullable=False)
+    chapter_id = db.Column(db.Integer, db.ForeignKey("chapters.id", ondelete="CASCADE"), nullable=False, index=True)
     chapter = db.relationship('Chapters', back_populates='quizzes')
-    questions = db.relationship('Questions', back_populates='quiz', cascade='all, delete-orphan')
-    scores = db.relationship('Scores', back_populates='quiz', cascade='all, delete-orphan')
+    questions = db.relationship('Questions', back_populates='quiz', cascade='all, delete-orphan', passive_deletes=True)
+    scores = db.relationship('Scores', back_populates='quiz', cascade='all, delete-orphan', passive_deletes=True)
 
 class Questions(db.Model):
     __tablename__ = 'questions'
@@ -71,28 +193,1466 @@ class Questions(db.Model):
     option_3 = db.Column(db.String(120), nullable=False)
     option_4 = db.Column(db.String(120), nullable=False)
     correct_answer = db.Column(db.Integer, nullable=False)
-    quiz_id = db.Column(db.Integer, db.ForeignKey("quizzes.id"), nullable=False)
+    quiz_id = db.Column(db.Integer, db.ForeignKey("quizzes.id", ondelete="CASCADE"), nullable=False, index=True)
     quiz = db.relationship('Quizzes', back_populates='questions')
 
 class Scores(db.Model):
     __tablename__ = 'scores'
+    __table_args__ = (
+        db.Index('ix_scores_user_id_timestamp', 'user_id', 'timestamp'),
+        db.Index('ix_scores_attempt_key', 'attempt_key', unique=True),
+    )
     id = db.Column(db.Integer, primary_key=True)
     score = db.Column(db.Integer, nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
-    quiz_id = db.Column(db.Integer, db.ForeignKey("quizzes.id"), nullable=False)
-    timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    quiz_id = db.Column(db.Integer, db.ForeignKey("quizzes.id", ondelete="CASCADE"), nullable=False, index=True)
+    timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
     total_scored = db.Column(db.Integer, nullable=False)
+    # "<user id>:<quiz id>:<attempt start>", so storing the same attempt twice is a no-op
+    attempt_key = db.Column(db.String(80))
+    # The chosen options, one byte per question (0 = unanswered, 1-4 = option) in the order
+    # given by the answer layout; NULL for attempts stored before answers were kept
+    answers = db.Column(db.LargeBinary)
+    layout_id = db.Column(db.Integer, db.ForeignKey("answer_layouts.id", ondelete="SET NULL"), index=True)
     user = db.relationship('Users', back_populates='scores')  
     quiz = db.relationship('Quizzes', back_populates='scores')
 
+class AnswerLayouts(db.Model):
+    # Question order of packed Scores.answers: byte i answers question_ids[i]. A quiz gets a new
+    # layout whenever its questions change, so older attempts still decode correctly.
+    __tablename__ = 'answer_layouts'
+    __table_args__ = (db.Index('ix_answer_layouts_quiz_id_question_ids', 'quiz_id', 'question_ids', unique=True),)
+    id = db.Column(db.Integer, primary_key=True)
+    quiz_id = db.Column(db.Integer, db.ForeignKey("quizzes.id", ondelete="CASCADE"), nullable=False)
+    # comma separated question ids
+    question_ids = db.Column(db.Text, nullable=False)
+
+class Attempts(db.Model):
+    # Quizzes a student has started and not submitted yet; one row per (user, quiz).
+    # Submitting deletes the row and rows past their deadline are graded from their saved
+    # answers and deleted, so the table only holds live attempts.
+    __tablename__ = 'attempts'
+    __table_args__ = (db.Index('ix_attempts_user_id_quiz_id', 'user_id', 'quiz_id', unique=True),)
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    quiz_id = db.Column(db.Integer, db.ForeignKey("quizzes.id", ondelete="CASCADE"), nullable=False, index=True)
+    started_at = db.Column(db.DateTime, nullable=False)
+    deadline = db.Column(db.DateTime, nullable=False, index=True)
+    # JSON object of question id -> chosen option saved so far
+    answers = db.Column(db.Text, nullable=False, default="{}")
+
+# Rollups of Scores, maintained by SQLite triggers on every insert/delete of a score
+# (see STATS_TRIGGERS) so dashboards read one row instead of scanning the score history.
+# `flask --app app rebuild-stats` recomputes them from scratch.
+
+class UserStats(db.Model):
+    __tablename__ = 'user_stats'
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    total_correct = db.Column(db.Integer, nullable=False, default=0)
+    total_possible = db.Column(db.Integer, nullable=False, default=0)
+    best_score = db.Column(db.Integer, nullable=False, default=0)
+    last_attempt = db.Column(db.DateTime)
+
+    @property
+    def percentage(self):
+        return int(self.total_correct * 100 / self.total_possible) if self.total_possible else 0
+
+class UserQuizStats(db.Model):
+    __tablename__ = 'user_quiz_stats'
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    quiz_id = db.Column(db.Integer, db.ForeignKey("quizzes.id", ondelete="CASCADE"), primary_key=True, index=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    total_correct = db.Column(db.Integer, nullable=False, default=0)
+    total_possible = db.Column(db.Integer, nullable=False, default=0)
+    best_score = db.Column(db.Integer, nullable=False, default=0)
+    last_score = db.Column(db.Integer, nullable=False, default=0)
+    last_attempt = db.Column(db.DateTime)
+
+class QuizStats(db.Model):
+    __tablename__ = 'quiz_stats'
+    quiz_id = db.Column(db.Integer, db.ForeignKey("quizzes.id", ondelete="CASCADE"), primary_key=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    total_correct = db.Column(db.Integer, nullable=False, default=0)
+    total_possible = db.Column(db.Integer, nullable=False, default=0)
+
+    @property
+    def mean_score(self):
+        return self.total_correct / self.attempts if self.attempts else 0
+
+class QuizScoreBuckets(db.Model):
+    # Score histogram per quiz: bucket n counts attempts that scored n*10% up to (n+1)*10% (9 includes 100%)
+    __tablename__ = 'quiz_score_buckets'
+    quiz_id = db.Column(db.Integer, db.ForeignKey("quizzes.id", ondelete="CASCADE"), primary_key=True)
+    bucket = db.Column(db.Integer, primary_key=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+
+class SubjectStats(db.Model):
+    __tablename__ = 'subject_stats'
+    subject_id = db.Column(db.Integer, db.ForeignKey("subjects.id", ondelete="CASCADE"), primary_key=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+
+# Leaderboards per quiz, chapter and subject. A user's points in a scope are the sum of their
+# best scores over the scope's quizzes. Leaderboard holds one row per (scope, user), indexed by
+# points for top-N; LeaderboardPoints counts users per points value, so "my rank" is one plus the
+# users on higher points values, read off the index without walking the users ahead of me.
+# Both are kept current by triggers on user_quiz_stats (see LEADERBOARD_TRIGGERS).
+
+class Leaderboard(db.Model):
+    __tablename__ = 'leaderboard'
+    __table_args__ = (db.Index('ix_leaderboard_rank', 'scope', 'scope_id', db.text('points DESC'), 'user_id'),)
+    scope = db.Column(db.String(8), primary_key=True)  # "quiz", "chapter" or "subject"
+    scope_id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True, index=True)
+    points = db.Column(db.Integer, nullable=False, default=0)
+    # quizzes of the scope the user attempted; the row goes away at 0
+    quizzes = db.Column(db.Integer, nullable=False, default=0)
+
+class LeaderboardPoints(db.Model):
+    __tablename__ = 'leaderboard_points'
+    scope = db.Column(db.String(8), primary_key=True)
+    scope_id = db.Column(db.Integer, primary_key=True)
+    points = db.Column(db.Integer, primary_key=True)
+    users = db.Column(db.Integer, nullable=False, default=0)
+
+# Item analysis per question, filled from Scores.answers by the `flask --app app item-stats`
+# batch job (see update_item_stats). Unlike the rollups above these lag until the job runs.
+
+class QuestionStats(db.Model):
+    __tablename__ = 'question_stats'
+    question_id = db.Column(db.Integer, db.ForeignKey("questions.id", ondelete="CASCADE"), primary_key=True)
+    quiz_id = db.Column(db.Integer, db.ForeignKey("quizzes.id", ondelete="CASCADE"), nullable=False, index=True)
+    responses = db.Column(db.Integer, nullable=False, default=0)
+    unanswered = db.Column(db.Integer, nullable=False, default=0)
+    option_1 = db.Column(db.Integer, nullable=False, default=0)
+    option_2 = db.Column(db.Integer, nullable=False, default=0)
+    option_3 = db.Column(db.Integer, nullable=False, default=0)
+    option_4 = db.Column(db.Integer, nullable=False, default=0)
+
+    def p_value(self, correct_answer):
+        # Share of attempts that picked the correct option (unanswered counts as wrong)
+        return getattr(self, f"option_{correct_answer}", 0) / self.responses if self.responses else 0
+
+    def option_shares(self):
+        return [getattr(self, f"option_{n}") * 100 / self.responses if self.responses else 0 for n in range(1, 5)]
+
+class JobProgress(db.Model):
+    # High-water mark of incremental batch jobs: the last source row id already processed
+    __tablename__ = 'job_progress'
+    name = db.Column(db.String(40), primary_key=True)
+    last_id = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime)
+
+# Schema migrations for existing databases. db.create_all() only creates missing tables, so
+# changes to tables that already exist are listed here; the applied version is kept in
+# SQLite's PRAGMA user_version. Run with `flask --app app migrate` (also done at startup).
+
+MIGRATIONS = [
+    (1, "index foreign keys and score timestamps", [
+        "CREATE INDEX IF NOT EXISTS ix_scores_user_id_timestamp ON scores (user_id, timestamp)",
+        "CREATE INDEX IF NOT EXISTS ix_scores_quiz_id ON scores (quiz_id)",
+        "CREATE INDEX IF NOT EXISTS ix_scores_timestamp ON scores (timestamp)",
+        "CREATE INDEX IF NOT EXISTS ix_questions_quiz_id ON questions (quiz_id)",
+        "CREATE INDEX IF NOT EXISTS ix_quizzes_chapter_id ON quizzes (chapter_id)",
+        "CREATE INDEX IF NOT EXISTS ix_chapters_subject_id ON chapters (subject_id)",
+    ]),
+    (2, "attempt keys for idempotent score inserts", [
+        lambda conn: add_column(conn, "scores", "attempt_key", "VARCHAR(80)"),
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_scores_attempt_key ON scores (attempt_key)",
+    ]),
+    (3, "full-text search index", [lambda conn: create_search_index(conn)]),
+    (4, "score rollup triggers", [lambda conn: create_stats_triggers(conn), lambda conn: rebuild_stats(conn)]),
+    (5, "packed per-question answers on scores", [
+        lambda conn: add_column(conn, "scores", "answers", "BLOB"),
+        lambda conn: add_column(conn, "scores", "layout_id", "INTEGER REFERENCES answer_layouts (id)"),
+    ]),
+    (6, "leaderboards", [lambda conn: create_stats_triggers(conn), lambda conn: rebuild_leaderboards(conn)]),
+    (7, "ON DELETE CASCADE foreign keys", [lambda conn: rebuild_foreign_keys(conn)]),
+    # every foreign key that cascades or nulls needs an index led by it, or each deleted parent
+    # row scans the child table
+    (8, "index cascading foreign keys", [
+        "CREATE INDEX IF NOT EXISTS ix_scores_layout_id ON scores (layout_id)",
+        "CREATE INDEX IF NOT EXISTS ix_leaderboard_user_id ON leaderboard (user_id)",
+    ]),
+]
+
+def add_column(conn, table, column, ddl):
+    # ALTER TABLE ... ADD COLUMN, skipped when create_all() already made the column
+    columns = [row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table})")]
+    if column not in columns:
+        conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+
+def migrate_database():
+    # A step is either an SQL statement or a callable taking the connection. Steps run in one
+    # transaction with foreign key enforcement off (SQLite only lets it be switched outside a
+    # transaction), so they may rebuild tables; violations left at the end fail the migration.
+    # Workers starting together queue on the write lock for up to MIGRATION_LOCK_TIMEOUT seconds.
+    with db.engine.connect() as conn:
+        if conn.exec_driver_sql("PRAGMA user_version").scalar() >= MIGRATIONS[-1][0]:
+            return
+        busy_timeout = conn.exec_driver_sql("PRAGMA busy_timeout").scalar()
+        conn.exec_driver_sql("PRAGMA foreign_keys = OFF")
+        conn.exec_driver_sql(f"PRAGMA busy_timeout = {int(app.config['MIGRATION_LOCK_TIMEOUT'] * 1000)}")
+        conn.commit()
+        try:
+            with conn.begin():
+                # The write lock is taken before the version is read, so a worker that waited
+                # for another one's migration finds it applied
+                conn.exec_driver_sql("BEGIN IMMEDIATE")
+                current = conn.exec_driver_sql("PRAGMA user_version").scalar()
+                for version, description, statements in MIGRATIONS:
+                    if version <= current:
+                        continue
+                    for statement in statements:
+                        if callable(statement):
+                            statement(conn)
+                        else:
+                            conn.exec_driver_sql(statement)
+                    conn.exec_driver_sql(f"PRAGMA user_version = {version}")
+                    app.logger.info("Applied migration %s: %s", version, description)
+                violations = conn.exec_driver_sql("PRAGMA foreign_key_check").all()
+                if violations:
+                    raise RuntimeError(f"migration left {len(violations)} foreign key violations, e.g. {violations[0]}")
+        finally:
+            conn.exec_driver_sql("PRAGMA foreign_keys = ON")
+            conn.exec_driver_sql(f"PRAGMA busy_timeout = {busy_timeout}")
+            conn.commit()
+
+def rebuild_table(conn, table):
+    # SQLite cannot alter a table's foreign keys, so the table is created afresh from its model
+    # under a temporary name, rows are copied over and it is swapped in (SQLite's documented
+    # 12-step procedure). Rows whose CASCADE parent is gone are left behind and SET NULL
+    # references to missing rows are cleared. Indexes are recreated here, triggers by the caller.
+    # Returns the number of rows left behind.
+    temporary = f"{table.name}_rebuild"
+    ddl = str(CreateTable(table).compile(dialect=conn.dialect))
+    conn.exec_driver_sql(ddl.replace(f"CREATE TABLE {table.name} ", f"CREATE TABLE {temporary} ", 1))
+    existing = {row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table.name})")}
+    columns, values, conditions = [], [], []
+    for column in table.columns:
+        if column.name not in existing:
+            continue
+        columns.append(column.name)
+        values.append(column.name)
+        for fk in column.foreign_keys:
+            parent = f"SELECT {fk.column.name} FROM {fk.column.table.name}"
+            if fk.ondelete == "CASCADE":
+                conditions.append(f"{column.name} IN ({parent})")
+            elif fk.ondelete == "SET NULL":
+                values[-1] = f"CASE WHEN {column.name} IN ({parent}) THEN {column.name} END"
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    before = conn.exec_driver_sql(f"SELECT count(*) FROM {table.name}").scalar()
+    copied = conn.exec_driver_sql(f"INSERT INTO {temporary} ({', '.join(columns)}) "
+                                  f"SELECT {', '.join(values)} FROM {table.name}{where}").rowcount
+    conn.exec_driver_sql(f"DROP TABLE {table.name}")
+    conn.exec_driver_sql(f"ALTER TABLE {temporary} RENAME TO {table.name}")
+    for index in table.indexes:
+        index.create(conn, checkfirst=True)
+    return before - copied
+
+def rebuild_foreign_keys(conn):
+    # Triggers referencing a table block renaming its rebuilt copy into place; they are all
+    # recreated at the end. Tables go parents first, so children are checked against clean parents.
+    for (trigger,) in conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'trigger'").all():
+        conn.exec_driver_sql(f"DROP TRIGGER {trigger}")
+    dropped = 0
+    for table in db.metadata.sorted_tables:
+        if table.foreign_keys:
+            dropped += rebuild_table(conn, table)
+    create_search_triggers(conn)
+    create_stats_triggers(conn)
+    if dropped:
+        app.logger.info("Dropped %s orphaned rows, rebuilding derived tables", dropped)
+        rebuild_search_index(conn)
+        rebuild_stats(conn)
+
+@app.cli.command("migrate")
+def migrate_command():
+    db.create_all()
+    migrate_database()
+
+# Score rollup maintenance. {row} is "new" in the insert trigger and "old" in the delete trigger.
+
+SCORE_BUCKET = "(CASE WHEN {row}.total_scored > 0 THEN min({row}.score * 10 / {row}.total_scored, 9) ELSE 0 END)"
+SCORE_SUBJECT = "(SELECT chapters.subject_id FROM quizzes JOIN chapters ON chapters.id = quizzes.chapter_id WHERE quizzes.id = {row}.quiz_id)"
+
+STATS_TRIGGERS = [
+    f"""CREATE TRIGGER IF NOT EXISTS stats_scores_insert AFTER INSERT ON scores BEGIN
+        INSERT INTO user_stats (user_id, attempts, total_correct, total_possible, best_score, last_attempt)
+        VALUES (new.user_id, 1, new.score, new.total_scored, new.score, new.timestamp)
+        ON CONFLICT (user_id) DO UPDATE SET attempts = attempts + 1,
+            total_correct = total_correct + excluded.total_correct,
+            total_possible = total_possible + excluded.total_possible,
+            best_score = max(best_score, excluded.best_score),
+            last_attempt = max(last_attempt, excluded.last_attempt);
+        INSERT INTO user_quiz_stats (user_id, quiz_id, attempts, total_correct, total_possible, best_score, last_score, last_attempt)
+        VALUES (new.user_id, new.quiz_id, 1, new.score, new.total_scored, new.score, new.score, new.timestamp)
+        ON CONFLICT (user_id, quiz_id) DO UPDATE SET attempts = attempts + 1,
+            total_correct = total_correct + excluded.total_correct,
+            total_possible = total_possible + excluded.total_possible,
+            best_score = max(best_score, excluded.best_score),
+            last_score = CASE WHEN excluded.last_attempt >= last_attempt THEN excluded.last_score ELSE last_score END,
+            last_attempt = max(last_attempt, excluded.last_attempt);
+        INSERT INTO quiz_stats (quiz_id, attempts, total_correct, total_possible)
+        VALUES (new.quiz_id, 1, new.score, new.total_scored)
+        ON CONFLICT (quiz_id) DO UPDATE SET attempts = attempts + 1,
+            total_correct = total_correct + excluded.total_correct,
+            total_possible = total_possible + excluded.total_possible;
+        INSERT INTO quiz_score_buckets (quiz_id, bucket, attempts)
+        VALUES (new.quiz_id, {SCORE_BUCKET.format(row="new")}, 1)
+        ON CONFLICT (quiz_id, bucket) DO UPDATE SET attempts = attempts + 1;
+        INSERT INTO subject_stats (subject_id, attempts)
+        SELECT {SCORE_SUBJECT.format(row="new")}, 1 WHERE {SCORE_SUBJECT.format(row="new")} IS NOT NULL
+        ON CONFLICT (subject_id) DO UPDATE SET attempts = attempts + 1;
+    END""",
+    # Best score and latest attempt are only looked up again when the deleted row could have held them
+    f"""CREATE TRIGGER IF NOT EXISTS stats_scores_delete AFTER DELETE ON scores BEGIN
+        UPDATE user_stats SET attempts = attempts - 1,
+            total_correct = total_correct - old.score,
+            total_possible = total_possible - old.total_scored,
+            best_score = CASE WHEN old.score < best_score THEN best_score
+                ELSE coalesce((SELECT max(score) FROM scores WHERE user_id = old.user_id), 0) END,
+            last_attempt = CASE WHEN old.timestamp < last_attempt THEN last_attempt
+                ELSE (SELECT max(timestamp) FROM scores WHERE user_id = old.user_id) END
+        WHERE user_id = old.user_id;
+        DELETE FROM user_stats WHERE user_id = old.user_id AND attempts <= 0;
+        UPDATE user_quiz_stats SET attempts = attempts - 1,
+            total_correct = total_correct - old.score,
+            total_possible = total_possible - old.total_scored,
+            best_score = CASE WHEN old.score < best_score THEN best_score
+                ELSE coalesce((SELECT max(score) FROM scores WHERE user_id = old.user_id AND quiz_id = old.quiz_id), 0) END,
+            last_score = CASE WHEN old.timestamp < last_attempt THEN last_score
+                ELSE coalesce((SELECT score FROM scores WHERE user_id = old.user_id AND quiz_id = old.quiz_id
+                               ORDER BY timestamp DESC, id DESC LIMIT 1), 0) END,
+            last_attempt = CASE WHEN old.timestamp < last_attempt THEN last_attempt
+                ELSE (SELECT max(timestamp) FROM scores WHERE user_id = old.user_id AND quiz_id = old.quiz_id) END
+        WHERE user_id = old.user_id AND quiz_id = old.quiz_id;
+        DELETE FROM user_quiz_stats WHERE user_id = old.user_id AND quiz_id = old.quiz_id AND attempts <= 0;
+        UPDATE quiz_stats SET attempts = attempts - 1,
+            total_correct = total_correct - old.score,
+            total_possible = total_possible - old.total_scored
+        WHERE quiz_id = old.quiz_id;
+        DELETE FROM quiz_stats WHERE quiz_id = old.quiz_id AND attempts <= 0;
+        UPDATE quiz_score_buckets SET attempts = attempts - 1
+        WHERE quiz_id = old.quiz_id AND bucket = {SCORE_BUCKET.format(row="old")};
+        DELETE FROM quiz_score_buckets WHERE quiz_id = old.quiz_id AND attempts <= 0;
+        UPDATE subject_stats SET attempts = attempts - 1 WHERE subject_id = {SCORE_SUBJECT.format(row="old")};
+        DELETE FROM subject_stats WHERE attempts <= 0;
+    END""",
+    # ON DELETE CASCADE removes a parent row before its children, so the delete trigger above
+    # could no longer find the subject of a cascaded score. Deleting a quiz or chapter therefore
+    # drops its scores first, while the quiz -> chapter -> subject chain is still intact.
+    """CREATE TRIGGER IF NOT EXISTS stats_quizzes_delete BEFORE DELETE ON quizzes BEGIN
+        DELETE FROM scores WHERE quiz_id = old.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS stats_chapters_delete BEFORE DELETE ON chapters BEGIN
+        DELETE FROM scores WHERE quiz_id IN (SELECT id FROM quizzes WHERE chapter_id = old.id);
+    END""",
+]
+
+def create_stats_triggers(conn):
+    for statement in STATS_TRIGGERS + LEADERBOARD_TRIGGERS:
+        conn.exec_driver_sql(statement)
+
+def rebuild_stats(conn):
+    for table in ("user_stats", "user_quiz_stats", "quiz_stats", "quiz_score_buckets", "subject_stats"):
+        conn.exec_driver_sql(f"DELETE FROM {table}")
+    conn.exec_driver_sql("""
+        INSERT INTO user_stats (user_id, attempts, total_correct, total_possible, best_score, last_attempt)
+        SELECT user_id, count(*), sum(score), sum(total_scored), max(score), max(timestamp)
+        FROM scores GROUP BY user_id""")
+    conn.exec_driver_sql("""
+        INSERT INTO user_quiz_stats (user_id, quiz_id, attempts, total_correct, total_possible, best_score, last_score, last_attempt)
+        SELECT user_id, quiz_id, count(*), sum(score), sum(total_scored), max(score),
+               (SELECT s.score FROM scores s WHERE s.user_id = scores.user_id AND s.quiz_id = scores.quiz_id
+                ORDER BY s.timestamp DESC, s.id DESC LIMIT 1),
+               max(timestamp)
+        FROM scores GROUP BY user_id, quiz_id""")
+    conn.exec_driver_sql("""
+        INSERT INTO quiz_stats (quiz_id, attempts, total_correct, total_possible)
+        SELECT quiz_id, count(*), sum(score), sum(total_scored) FROM scores GROUP BY quiz_id""")
+    conn.exec_driver_sql(f"""
+        INSERT INTO quiz_score_buckets (quiz_id, bucket, attempts)
+        SELECT quiz_id, {SCORE_BUCKET.format(row="scores")}, count(*) FROM scores GROUP BY 1, 2""")
+    conn.exec_driver_sql("""
+        INSERT INTO subject_stats (subject_id, attempts)
+        SELECT chapters.subject_id, count(*) FROM scores
+        JOIN quizzes ON quizzes.id = scores.quiz_id JOIN chapters ON chapters.id = quizzes.chapter_id
+        GROUP BY chapters.subject_id""")
+    # the user_quiz_stats triggers above touched the leaderboards row by row; start them clean
+    rebuild_leaderboards(conn)
+
+# Leaderboard maintenance. A change of one user_quiz_stats row moves the user's points by
+# `points` and their attempted-quiz count by `quizzes` in the quiz's own, chapter and subject
+# scopes: take the user out of their old points bucket, apply the change, put them back in.
+
+LEADERBOARD_SCOPE_IDS = {
+    "quiz": "{row}.quiz_id",
+    "chapter": "(SELECT chapter_id FROM quizzes WHERE id = {row}.quiz_id)",
+    "subject": SCORE_SUBJECT,
+}
+
+def leaderboard_changes(row, points, quizzes):
+    statements = []
+    for scope, scope_id in LEADERBOARD_SCOPE_IDS.items():
+        scope_id = scope_id.format(row=row)
+        entry = f"scope = '{scope}' AND scope_id = {scope_id} AND user_id = {row}.user_id"
+        statements.append(f"""
+        UPDATE leaderboard_points SET users = users - 1
+        WHERE scope = '{scope}' AND scope_id = {scope_id} AND points = (SELECT points FROM leaderboard WHERE {entry});
+        DELETE FROM leaderboard_points WHERE scope = '{scope}' AND scope_id = {scope_id} AND users <= 0;
+        INSERT INTO leaderboard (scope, scope_id, user_id, points, quizzes)
+        SELECT '{scope}', {scope_id}, {row}.user_id, {points}, {quizzes} WHERE {scope_id} IS NOT NULL
+        ON CONFLICT (scope, scope_id, user_id) DO UPDATE SET
+            points = points + excluded.points, quizzes = quizzes + excluded.quizzes;
+        DELETE FROM leaderboard WHERE {entry} AND quizzes <= 0;
+        INSERT INTO leaderboard_points (scope, scope_id, points, users)
+        SELECT scope, scope_id, points, 1 FROM leaderboard WHERE {entry}
+        ON CONFLICT (scope, scope_id, points) DO UPDATE SET users = users + 1;""")
+    return "".join(statements)
+
+LEADERBOARD_TRIGGERS = [
+    f"""CREATE TRIGGER IF NOT EXISTS leaderboard_insert AFTER INSERT ON user_quiz_stats BEGIN
+        {leaderboard_changes("new", "new.best_score", 1)}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS leaderboard_update AFTER UPDATE OF best_score ON user_quiz_stats
+    WHEN new.best_score <> old.best_score BEGIN
+        {leaderboard_changes("new", "new.best_score - old.best_score", 0)}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS leaderboard_delete AFTER DELETE ON user_quiz_stats BEGIN
+        {leaderboard_changes("old", "-old.best_score", -1)}
+    END""",
+] + [
+    # scope_id is not a foreign key, so a deleted quiz, chapter or subject takes its board along here
+    f"""CREATE TRIGGER IF NOT EXISTS leaderboard_{table}_delete AFTER DELETE ON {table} BEGIN
+        DELETE FROM leaderboard WHERE scope = '{scope}' AND scope_id = old.id;
+        DELETE FROM leaderboard_points WHERE scope = '{scope}' AND scope_id = old.id;
+    END"""
+    for scope, table in (("quiz", "quizzes"), ("chapter", "chapters"), ("subject", "subjects"))
+]
+
+def rebuild_leaderboards(conn):
+    conn.exec_driver_sql("DELETE FROM leaderboard")
+    conn.exec_driver_sql("DELETE FROM leaderboard_points")
+    conn.exec_driver_sql("""
+        INSERT INTO leaderboard (scope, scope_id, user_id, points, quizzes)
+        SELECT 'quiz', quiz_id, user_id, best_score, 1 FROM user_quiz_stats
+        UNION ALL
+        SELECT 'chapter', quizzes.chapter_id, user_id, sum(best_score), count(*) FROM user_quiz_stats
+        JOIN quizzes ON quizzes.id = user_quiz_stats.quiz_id
+        GROUP BY quizzes.chapter_id, user_id
+        UNION ALL
+        SELECT 'subject', chapters.subject_id, user_id, sum(best_score), count(*) FROM user_quiz_stats
+        JOIN quizzes ON quizzes.id = user_quiz_stats.quiz_id JOIN chapters ON chapters.id = quizzes.chapter_id
+        GROUP BY chapters.subject_id, user_id""")
+    conn.exec_driver_sql("""
+        INSERT INTO leaderboard_points (scope, scope_id, points, users)
+        SELECT scope, scope_id, points, count(*) FROM leaderboard GROUP BY scope, scope_id, points""")
+
+@app.cli.command("rebuild-stats")
+def rebuild_stats_command():
+    with db.engine.begin() as conn:
+        rebuild_stats(conn)
+
+# Full-text search over every entity the admin can look up. One FTS5 table holds a
+# (title, body) document per row; rowid = source id * 8 + kind, so triggers can replace or
+# drop a document by rowid. The triggers keep it in sync for ORM, bulk and cascade writes alike.
+
+SEARCH_SOURCES = [
+    # kind, label, table, title column, body expression
+    (1, "User", "users", "name", "{row}.email || ' ' || {row}.qualification"),
+    (2, "Subject", "subjects", "name", "{row}.description"),
+    (3, "Chapter", "chapters", "name", "{row}.description"),
+    (4, "Quiz", "quizzes", "name", "{row}.remarks"),
+    (5, "Question", "questions", "question_text",
+     "{row}.option_1 || ' ' || {row}.option_2 || ' ' || {row}.option_3 || ' ' || {row}.option_4"),
+]
+SEARCH_LABELS = {kind: label for kind, label, table, title, body in SEARCH_SOURCES}
+
+def create_search_index(conn):
+    conn.exec_driver_sql("CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(title, body, prefix='2 3')")
+    create_search_triggers(conn)
+    rebuild_search_index(conn)
+
+def create_search_triggers(conn):
+    for kind, label, table, title, body in SEARCH_SOURCES:
+        insert_new = (f"INSERT INTO search_index(rowid, title, body) "
+                      f"VALUES (new.id * 8 + {kind}, new.{title}, {body.format(row='new')});")
+        delete_old = f"DELETE FROM search_index WHERE rowid = old.id * 8 + {kind};"
+        conn.exec_driver_sql(f"CREATE TRIGGER IF NOT EXISTS search_{table}_insert AFTER INSERT ON {table} "
+                             f"BEGIN {insert_new} END")
+        conn.exec_driver_sql(f"CREATE TRIGGER IF NOT EXISTS search_{table}_update AFTER UPDATE ON {table} "
+                             f"BEGIN {delete_old} {insert_new} END")
+        conn.exec_driver_sql(f"CREATE TRIGGER IF NOT EXISTS search_{table}_delete AFTER DELETE ON {table} "
+                             f"BEGIN {delete_old} END")
+
+def rebuild_search_index(conn):
+    conn.exec_driver_sql("DELETE FROM search_index")
+    for kind, label, table, title, body in SEARCH_SOURCES:
+        conn.exec_driver_sql(f"INSERT INTO search_index(rowid, title, body) "
+                             f"SELECT id * 8 + {kind}, {title}, {body.format(row=table)} FROM {table}")
+
+def search_match_expression(text):
+    # Every word must match as a prefix, e.g. "alg lin" -> "alg"* "lin"*
+    return " ".join(f'"{word}"*' for word in re.findall(r"\w+", text))
+
+def search(text, page=1):
+    # Returns ([(label, id, title)], has more pages), best matches first
+    expression = search_match_expression(text)
+    if not expression:
+        return [], False
+    size = app.config["SEARCH_PAGE_SIZE"]
+    rows = db.session.execute(db.text(
+        "SELECT rowid, title FROM search_index WHERE search_index MATCH :expression "
+        "ORDER BY bm25(search_index, 10.0, 1.0) LIMIT :limit OFFSET :offset"),
+        {"expression": expression, "limit": size + 1, "offset": (page - 1) * size}).all()
+    results = [(SEARCH_LABELS[rowid % 8], rowid // 8, title) for rowid, title in rows[:size]]
+    return results, len(rows) > size
+
+# Keyset (cursor) pagination. A page is read with WHERE (sort columns) > / < (last row's values)
+# plus LIMIT, so deep pages cost the same as the first one. The cursor is the last row's sort
+# values, JSON encoded into an opaque URL-safe token.
+
+def encode_cursor(values):
+    values = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+def cursor_value(column, value):
+    # The value as the column's type; ValueError for anything a client could not have been given
+    if isinstance(column.type, db.DateTime):
+        if not isinstance(value, str):
+            raise ValueError
+        return datetime.fromisoformat(value)
+    if isinstance(column.type, db.Integer):
+        # bool is an int too, and SQLite integers are 64 bit
+        if type(value) is not int or not -2**63 <= value < 2**63:
+            raise ValueError
+        return value
+    if not isinstance(value, str):
+        raise ValueError
+    return value
+
+def decode_cursor(token, columns):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError
+        return [cursor_value(column, value) for column, value in zip(columns, values)]
+    except ValueError:
+        abort(400)
+
+def keyset_page(query, *columns, descending=False):
+    # Returns (items, cursor of the next page or None) for the ?after= / ?per_page= request args
+    size = min(max(request.args.get('per_page', app.config["PAGE_SIZE"], type=int), 1), app.config["MAX_PAGE_SIZE"])
+    after = request.args.get('after')
+    if after:
+        last = tuple_(*decode_cursor(after, columns))
+        query = query.filter(tuple_(*columns) < last if descending else tuple_(*columns) > last)
+    order = [column.desc() for column in columns] if descending else list(columns)
+    items = query.order_by(*order).limit(size + 1).all()
+    if len(items) <= size:
+        return items, None
+    items = items[:size]
+    return items, encode_cursor([getattr(items[-1], column.key) for column in columns])
+
+@app.template_global()
+def page_url(**changes):
+    # Current URL with some query args replaced; None drops an arg
+    args = dict(request.view_args, **request.args.to_dict())
+    args.update(changes)
+    return url_for(request.endpoint, **{key: value for key, value in args.items() if value is not None})
+
+# Per-request SQL statement counting, used to catch N+1 queries
+
+QUERY_BUDGETS = {}
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+def query_budget(limit):
+    # Decorator pinning the max number of SQL statements for one route
+    def decorator(view):
+        QUERY_BUDGETS[view.__name__] = limit
+        return view
+    return decorator
+
+@event.listens_for(Engine, "before_cursor_execute")
+def count_sql_statement(conn, cursor, statement, parameters, context, executemany):
+    if has_app_context() and "sql_count" in g:
+        g.sql_count += 1
+
+@app.before_request
+def start_query_count():
+    g.sql_count = 0
+
+@app.after_request
+def check_query_budget(response):
+    limit = QUERY_BUDGETS.get(request.endpoint, app.config["SQL_QUERY_BUDGET"])
+    count = g.get("sql_count", 0)
+    if limit is not None and count > limit:
+        message = f"{request.endpoint} issued {count} SQL statements (budget {limit})"
+        if app.testing or app.config["SQL_QUERY_BUDGET_STRICT"]:
+            raise QueryBudgetExceeded(message)
+        app.logger.warning(message)
+    return response
+
+# Request instrumentation: latency per endpoint, SQL statements and SQL time per request and
+# template render times, kept in this process and served on /metrics in Prometheus text format.
+# Recording is a few perf_counter() calls and dict updates under one lock per request. With
+# several worker processes, each reports its own numbers for the requests it served.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SQL_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+class Histogram:
+    def __init__(self, name, help, labels, buckets):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, buckets
+        # label values -> [count per bucket (last one is +Inf), sum, count]
+        self.series = {}
+
+    def observe(self, label_values, value):
+        series = self.series.get(label_values)
+        if series is None:
+            series = self.series.setdefault(label_values, [0] * (len(self.buckets) + 1) + [0.0, 0])
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for label_values, series in sorted(self.series.items()):
+            labels = metric_labels(self.labels, label_values)
+            running = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                running += count
+                yield f'{self.name}_bucket{{{labels},le="{bound}"}} {running}'
+            yield f"{self.name}_sum{{{labels}}} {series[-2]}"
+            yield f"{self.name}_count{{{labels}}} {series[-1]}"
+
+class Counter:
+    def __init__(self, name, help, labels):
+        self.name, self.help, self.labels = name, help, labels
+        self.series = {}
+
+    def inc(self, label_values, amount=1):
+        self.series[label_values] = self.series.get(label_values, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for label_values, value in sorted(self.series.items()):
+            yield f"{self.name}{{{metric_labels(self.labels, label_values)}}} {value}"
+
+def metric_labels(names, values):
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in values)
+    return ",".join(f'{name}="{value}"' for name, value in zip(names, escaped))
+
+REQUESTS = Counter("quizmaster_requests_total", "Requests served.", ("endpoint", "method", "status"))
+REQUEST_LATENCY = Histogram("quizmaster_request_duration_seconds", "Request handling time.", ("endpoint",), LATENCY_BUCKETS)
+SQL_STATEMENTS = Histogram("quizmaster_sql_statements_per_request", "SQL statements issued per request.", ("endpoint",), SQL_COUNT_BUCKETS)
+SQL_LATENCY = Histogram("quizmaster_sql_duration_seconds", "Time spent in SQL per request.", ("endpoint",), LATENCY_BUCKETS)
+TEMPLATE_LATENCY = Histogram("quizmaster_template_render_seconds", "Template render time.", ("template",), LATENCY_BUCKETS)
+PROFILED = Counter("quizmaster_profiled_requests_total", "Requests run under the profiler.", ("endpoint",))
+METRICS = (REQUESTS, REQUEST_LATENCY, SQL_STATEMENTS, SQL_LATENCY, TEMPLATE_LATENCY, PROFILED)
+metrics_lock = threading.Lock()
+
+@event.listens_for(Engine, "before_cursor_execute")
+def start_sql_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info["sql_started"] = time.perf_counter()
+
+@event.listens_for(Engine, "after_cursor_execute")
+def stop_sql_timer(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["sql_started"]
+    if has_request_context() and "sql_time" in g:
+        g.sql_time += elapsed
+
+def start_template_timer(sender, template, context, **extra):
+    if has_request_context():
+        g.setdefault("template_started", []).append(time.perf_counter())
+
+def stop_template_timer(sender, template, context, **extra):
+    if has_request_context() and g.get("template_started"):
+        elapsed = time.perf_counter() - g.template_started.pop()
+        with metrics_lock:
+            TEMPLATE_LATENCY.observe((template.name,), elapsed)
+
+before_render_template.connect(start_template_timer, app)
+template_rendered.connect(stop_template_timer, app)
+
+@app.before_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    g.sql_time = 0.0
+    rate = app.config["PROFILE_SAMPLE_RATE"]
+    if rate and random.random() < rate:
+        g.profiler = start_profiler()
+
+@app.after_request
+def record_request_metrics(response):
+    if "request_started" not in g or not app.config["METRICS_ENABLED"] or request.endpoint == "metrics":
+        return response
+    endpoint = request.endpoint or "unmatched"
+    elapsed = time.perf_counter() - g.request_started
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        save_profile(profiler, endpoint)
+    with metrics_lock:
+        REQUESTS.inc((endpoint, request.method, response.status_code))
+        REQUEST_LATENCY.observe((endpoint,), elapsed)
+        SQL_STATEMENTS.observe((endpoint,), g.get("sql_count", 0))
+        SQL_LATENCY.observe((endpoint,), g.sql_time)
+        if profiler is not None:
+            PROFILED.inc((endpoint,))
+    return response
+
+def start_profiler():
+    if app.config["PROFILER"] == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:  # fall back to the standard library profiler
+            pass
+        else:
+            profiler = Profiler()
+            profiler.start()
+            return profiler
+    import cProfile
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+def save_profile(profiler, endpoint):
+    # <endpoint>-<unix ms>-<pid>.prof (cProfile, open with pstats/snakeviz) or .html (pyinstrument)
+    os.makedirs(app.config["PROFILE_DIR"], exist_ok=True)
+    path = os.path.join(app.config["PROFILE_DIR"], f"{endpoint}-{int(time.time() * 1000)}-{os.getpid()}")
+    if hasattr(profiler, "dump_stats"):
+        profiler.disable()
+        profiler.dump_stats(path + ".prof")
+    else:
+        profiler.stop()
+        with open(path + ".html", "w") as f:
+            f.write(profiler.output_html())
+
+@app.route('/metrics')
+def metrics():
+    if not app.config["METRICS_ENABLED"]:
+        abort(404)
+    with metrics_lock:
+        lines = [line for metric in METRICS for line in metric.render()]
+    return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
+
+# Static asset pipeline. url_for('static', filename=...) resolves to the hashed copy listed in
+# static/dist/manifest.json; before the first build-assets run it adds ?v=<content hash> instead.
+# Either way the URL changes with the content, so the file can be cached as immutable.
+
+STATIC_COMPRESSIBLE = (".css", ".js", ".svg", ".json", ".txt", ".map", ".html")
+# {"mtime": manifest mtime, "files": {name: hashed name}}, reloaded when the manifest changes
+STATIC_MANIFEST = {}
+# name -> (mtime, content hash) for unbuilt files
+STATIC_VERSIONS = {}
+
+def file_digest(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:12]
+
+def static_manifest():
+    path = os.path.join(app.static_folder, app.config["STATIC_DIST"], "manifest.json")
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return {}
+    if STATIC_MANIFEST.get("mtime") != mtime:
+        with open(path) as f:
+            STATIC_MANIFEST.update(mtime=mtime, files=json.load(f))
+    return STATIC_MANIFEST["files"]
+
+def static_version(filename):
+    path = safe_join(app.static_folder, filename)
+    if path is None or not os.path.isfile(path):
+        return None
+    mtime = os.path.getmtime(path)
+    cached = STATIC_VERSIONS.get(filename)
+    if cached is None or cached[0] != mtime:
+        cached = STATIC_VERSIONS[filename] = (mtime, file_digest(path))
+    return cached[1]
+
+@app.url_defaults
+def fingerprint_static_url(endpoint, values):
+    if endpoint != "static" or "filename" not in values:
+        return
+    hashed = static_manifest().get(values["filename"])
+    if hashed:
+        values["filename"] = f"{app.config['STATIC_DIST']}/{hashed}"
+    else:
+        version = static_version(values["filename"])
+        if version:
+            values.setdefault("v", version)
+
+def serve_static(filename):
+    dist = app.config["STATIC_DIST"] + "/"
+    built = filename.startswith(dist)
+    # Only a URL naming the file's current content is cached for good: a hashed name the
+    # manifest lists, or ?v= equal to the file's digest
+    if built:
+        current = filename[len(dist):] in static_manifest().values()
+    else:
+        version = static_version(filename)
+        current = version is not None and request.args.get("v") == version
+    if not built and not current:
+        return Flask.send_static_file(app, filename)
+    # Built files may have a .br / .gz twin; pick the one the client accepts
+    path, encoding = filename, None
+    if built and filename.endswith(STATIC_COMPRESSIBLE):
+        for name, suffix in (("br", ".br"), ("gzip", ".gz")):
+            candidate = safe_join(app.static_folder, filename + suffix)
+            if request.accept_encodings[name] and candidate and os.path.isfile(candidate):
+                path, encoding = filename + suffix, name
+                break
+    response = send_from_directory(app.static_folder, path, mimetype=mimetypes.guess_type(filename)[0],
+                                   max_age=app.config["STATIC_MAX_AGE"] if current else None)
+    if built and filename.endswith(STATIC_COMPRESSIBLE):
+        response.vary.add("Accept-Encoding")
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    if current:
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+    return response
+
+@app.cli.command("build-assets")
+@click.option("--clean", is_flag=True, help="Remove hashed files the new manifest no longer lists.")
+def build_assets_command(clean):
+    # Uploaded images (UPLOAD_FOLDER) change at runtime and are left out
+    static = app.static_folder
+    dist = os.path.join(static, app.config["STATIC_DIST"])
+    skip = {dist, os.path.abspath(app.config["UPLOAD_FOLDER"])}
+    try:
+        import brotli
+    except ImportError:  # gzip only
+        brotli = None
+    manifest, written = {}, set()
+    for root, dirs, files in os.walk(static):
+        dirs[:] = sorted(d for d in dirs if os.path.join(root, d) not in skip)
+        for name in sorted(files):
+            if name.startswith("."):
+                continue
+            source = os.path.join(root, name)
+            filename = os.path.relpath(source, static).replace(os.sep, "/")
+            stem, ext = os.path.splitext(filename)
+            hashed = f"{stem}.{file_digest(source)}{ext}"
+            target = os.path.join(dist, hashed)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copyfile(source, target)
+            written.add(target)
+            if ext in STATIC_COMPRESSIBLE:
+                with open(source, "rb") as f:
+                    data = f.read()
+                variants = [(".gz", gzip.compress(data, 9, mtime=0))]
+                if brotli is not None:
+                    variants.append((".br", brotli.compress(data, quality=11)))
+                for suffix, packed in variants:
+                    if len(packed) < len(data):
+                        with open(target + suffix, "wb") as f:
+                            f.write(packed)
+                        written.add(target + suffix)
+            manifest[filename] = hashed
+    manifest_path = os.path.join(dist, "manifest.json")
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    written.add(manifest_path)
+    removed = 0
+    if clean:
+        for root, dirs, files in os.walk(dist):
+            for name in files:
+                if os.path.join(root, name) not in written:
+                    os.remove(os.path.join(root, name))
+                    removed += 1
+    print(f"{len(manifest)} static files fingerprinted into {dist}" + (f", {removed} stale files removed" if clean else ""))
+
+@app.after_request
+def compress_response(response):
+    if response.mimetype not in app.config["COMPRESS_MIMETYPES"] or response.direct_passthrough \
+            or response.is_streamed or "Content-Encoding" in response.headers:
+        return response
+    response.vary.add("Accept-Encoding")
+    if response.status_code != 200 or not request.accept_encodings["gzip"]:
+        return response
+    data = response.get_data()
+    if len(data) < app.config["COMPRESS_MIN_SIZE"]:
+        return response
+    response.set_data(gzip.compress(data, app.config["COMPRESS_LEVEL"]))
+    response.headers["Content-Encoding"] = "gzip"
+    # The gzipped body is a different representation: keep the validator, but only as a weak one
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+# Per-quiz caches, built once per quiz and shared by every student taking it:
+# ANSWER_KEYS: quiz_id -> (built at, ((form field, correct option), ...)) used for grading
+# QUIZ_FRAGMENTS: quiz_id -> (built at, rendered question section of quiz.html)
+# Local edits drop the entries once they commit; the TTL bounds staleness in other worker processes.
+# Every drop bumps the generation, and an entry is only stored if the generation it was read
+# under is still current, so a request that read the old rows cannot cache them again.
+
+ANSWER_KEYS = {}
+QUIZ_FRAGMENTS = {}
+QUIZ_CACHE_STATE = {"generation": 0}
+quiz_cache_lock = threading.Lock()
+
+def quiz_cache_generation():
+    return QUIZ_CACHE_STATE["generation"]
+
+def store_quiz_cache(cache, quiz_id, value, generation):
+    with quiz_cache_lock:
+        if QUIZ_CACHE_STATE["generation"] == generation:
+            cache[quiz_id] = (time.monotonic(), value)
+
+def cached_answer_key(quiz_id):
+    cached = ANSWER_KEYS.get(quiz_id)
+    if cached is not None and time.monotonic() - cached[0] < app.config["QUIZ_CACHE_TTL"]:
+        return cached[1]
+    return None
+
+def answer_key_statement(quiz_id):
+    return select(Questions.id, Questions.correct_answer).filter_by(quiz_id=quiz_id).order_by(Questions.id)
+
+def remember_answer_key(quiz_id, rows, generation):
+    key = tuple((str(question_id), str(correct)) for question_id, correct in rows)
+    store_quiz_cache(ANSWER_KEYS, quiz_id, key, generation)
+    return key
+
+def answer_key(quiz_id):
+    key = cached_answer_key(quiz_id)
+    if key is None:
+        generation = quiz_cache_generation()
+        key = remember_answer_key(quiz_id, db.session.execute(answer_key_statement(quiz_id)).all(), generation)
+    return key
+
+def grade(key, answers):
+    # A missing answer simply counts as wrong
+    score = sum(1 for field, correct in key if answers.get(field) == correct)
+    return score, len(key)
+
+# (quiz_id, question ids) -> AnswerLayouts.id; layouts never change once written
+ANSWER_LAYOUTS = {}
+OPTION_BYTES = {"1": 1, "2": 2, "3": 3, "4": 4}
+
+def pack_answers(key, answers):
+    return bytes(OPTION_BYTES.get(answers.get(field), 0) for field, correct in key)
+
+def layout_question_ids(key):
+    return ",".join(field for field, correct in key)
+
+def answer_layout(quiz_id, key):
+    question_ids = layout_question_ids(key)
+    layout_id = ANSWER_LAYOUTS.get((quiz_id, question_ids))
+    if layout_id is None:
+        db.session.execute(sqlite_insert(AnswerLayouts).on_conflict_do_nothing(),
+                           {"quiz_id": quiz_id, "question_ids": question_ids})
+        layout_id = db.session.query(AnswerLayouts.id).filter_by(quiz_id=quiz_id, question_ids=question_ids).scalar()
+        remember_layout_on_commit(db.session, (quiz_id, question_ids), layout_id)
+    return layout_id
+
+def remember_layout_on_commit(session, key, layout_id):
+    # The id is only cached once the inserting transaction commits; an id that was rolled back
+    # would otherwise be handed to every later submit of the quiz in this process
+    session.info.setdefault("new_layouts", {})[key] = layout_id
+
+@event.listens_for(Session, "after_commit")
+def cache_committed_layouts(session):
+    ANSWER_LAYOUTS.update(session.info.pop("new_layouts", {}))
+
+@event.listens_for(Session, "after_rollback")
+def forget_rolled_back_layouts(session):
+    session.info.pop("new_layouts", None)
+
+def score_row(user_id, quiz_id, attempt, key, answers, layout_id):
+    score, tot_score = grade(key, answers)
+    return dict(score=score, total_scored=tot_score, user_id=user_id, quiz_id=quiz_id,
+                timestamp=attempt.started_at,
+                attempt_key=f"{user_id}:{quiz_id}:{attempt.started_at.isoformat()}",
+                answers=pack_answers(key, answers), layout_id=layout_id)
+
+def quiz_fragment(quiz_id):
+    # Returns the rendered question section, or None when the quiz does not exist
+    cached = QUIZ_FRAGMENTS.get(quiz_id)
+    if cached is not None and time.monotonic() - cached[0] < app.config["QUIZ_CACHE_TTL"]:
+        return cached[1]
+    generation = quiz_cache_generation()
+    quiz = Quizzes.query.options(joinedload(Quizzes.chapter).joinedload(Chapters.subject)).filter_by(id=quiz_id).first()
+    if not quiz:
+        return None
+    questions = Questions.query.filter_by(quiz_id=quiz_id).order_by(Questions.id).all()
+    fragment = render_template('quiz_body.html', quiz=quiz, questions=questions)
+    store_quiz_cache(QUIZ_FRAGMENTS, quiz_id, fragment, generation)
+    return fragment
+
+def invalidate_quiz_caches(quiz_id):
+    with quiz_cache_lock:
+        QUIZ_CACHE_STATE["generation"] += 1
+        ANSWER_KEYS.pop(quiz_id, None)
+        QUIZ_FRAGMENTS.pop(quiz_id, None)
+        # a deleted quiz's layouts are gone, and SQLite may hand its id to a new quiz
+        for key in [key for key in ANSWER_LAYOUTS if key[0] == quiz_id]:
+            ANSWER_LAYOUTS.pop(key, None)
+
+def invalidate_quiz_fragments():
+    with quiz_cache_lock:
+        QUIZ_CACHE_STATE["generation"] += 1
+        QUIZ_FRAGMENTS.clear()
+
+def invalidate_all_quiz_caches():
+    with quiz_cache_lock:
+        QUIZ_CACHE_STATE["generation"] += 1
+        ANSWER_KEYS.clear()
+        QUIZ_FRAGMENTS.clear()
+        ANSWER_LAYOUTS.clear()
+
+@event.listens_for(db.session, "after_flush")
+def collect_changed_quizzes(session, flush_context):
+    # Dropped after the commit: until then other requests still read, and would re-cache, the old rows
+    changed = session.info.setdefault("changed_quizzes", set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Questions):
+            changed.add(obj.quiz_id)
+        elif isinstance(obj, Quizzes):
+            changed.add(obj.id)
+        elif isinstance(obj, (Chapters, Subjects)):
+            # quiz pages show chapter and subject names
+            session.info["changed_quiz_pages"] = True
+
+@event.listens_for(db.session, "after_commit")
+def invalidate_changed_quizzes(session):
+    for quiz_id in session.info.pop("changed_quizzes", ()):
+        invalidate_quiz_caches(quiz_id)
+    if session.info.pop("changed_quiz_pages", False):
+        invalidate_quiz_fragments()
+
+@event.listens_for(db.session, "after_rollback")
+def forget_changed_quizzes(session):
+    session.info.pop("changed_quizzes", None)
+    session.info.pop("changed_quiz_pages", None)
+
+# Background flush threads: one per name and process, started lazily so forked workers each
+# get their own. `flush` runs in an app context every app.config[interval_key] seconds.
+
+BACKGROUND_THREADS = {}
+background_lock = threading.Lock()
+
+def run_periodically(name, flush, interval_key):
+    while True:
+        time.sleep(app.config[interval_key])
+        try:
+            with app.app_context():
+                flush()
+        except Exception:
+            app.logger.exception("Background %s failed, retrying", name)
+
+def start_background(name, flush, interval_key):
+    running = BACKGROUND_THREADS.get(name)
+    if running is not None and running[0] == os.getpid():
+        return
+    with background_lock:
+        running = BACKGROUND_THREADS.get(name)
+        if running is None or running[0] != os.getpid():
+            thread = threading.Thread(target=run_periodically, args=(name, flush, interval_key), name=name, daemon=True)
+            thread.start()
+            BACKGROUND_THREADS[name] = (os.getpid(), thread)
+
+# Score storage. Every graded attempt goes through store_scores(); with write-behind enabled,
+# submit_quiz only appends the row to a local SQLite queue file and a background thread moves
+# queued rows into Scores in batched transactions. The queue runs in WAL mode with
+# synchronous = FULL, so every insert is fsynced before the student sees the result page and
+# survives process crashes, restarts and power loss.
+# Rows are keyed by attempt_key, so replays after a crash or a double submit insert nothing.
+
+score_queue_local = threading.local()
+
+def score_insert():
+    return sqlite_insert(Scores).on_conflict_do_nothing(index_elements=["attempt_key"])
+
+def store_scores(rows):
+    db.session.execute(score_insert(), rows)
+    db.session.commit()
+
+def save_scores(rows):
+    # Stores graded attempts, directly or through the queue, and commits the session with them
+    if app.config["SCORE_WRITE_BEHIND"]:
+        for row in rows:
+            enqueue_score(row)
+        db.session.commit()
+    elif rows:
+        store_scores(rows)
+    else:
+        db.session.commit()
+
+def score_queue():
+    conn = getattr(score_queue_local, "conn", None)
+    if conn is None:
+        os.makedirs(os.path.dirname(app.config["SCORE_QUEUE_PATH"]), exist_ok=True)
+        conn = sqlite3.connect(app.config["SCORE_QUEUE_PATH"], timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = FULL")
+        conn.execute("CREATE TABLE IF NOT EXISTS pending (attempt_key TEXT PRIMARY KEY, payload TEXT NOT NULL)")
+        score_queue_local.conn = conn
+    return conn
+
+def enqueue_score(row):
+    payload = json.dumps(dict(row, timestamp=row["timestamp"].isoformat(),
+                              answers=base64.b64encode(row["answers"]).decode()))
+    score_queue().execute("INSERT OR IGNORE INTO pending VALUES (?, ?)", (row["attempt_key"], payload))
+    start_score_writer()
+
+def flush_score_queue():
+    # Moves one batch from the queue into Scores; returns how many rows it took
+    conn = score_queue()
+    items = conn.execute("SELECT attempt_key, payload FROM pending ORDER BY rowid LIMIT ?",
+                         (app.config["SCORE_QUEUE_BATCH"],)).fetchall()
+    if not items:
+        return 0
+    rows = []
+    for key, payload in items:
+        row = json.loads(payload)
+        row["timestamp"] = datetime.fromisoformat(row["timestamp"])
+        # rows queued before answers were kept have neither field
+        row["answers"] = base64.b64decode(row["answers"]) if row.get("answers") is not None else None
+        row.setdefault("layout_id", None)
+        rows.append(row)
+    # attempts on a quiz (or by a user) deleted while queued would break the foreign keys
+    quizzes = {quiz_id for (quiz_id,) in db.session.query(Quizzes.id).filter(Quizzes.id.in_({row["quiz_id"] for row in rows}))}
+    users = {user_id for (user_id,) in db.session.query(Users.id).filter(Users.id.in_({row["user_id"] for row in rows}))}
+    layouts = {layout_id for (layout_id,) in db.session.query(AnswerLayouts.id).filter(
+        AnswerLayouts.id.in_({row["layout_id"] for row in rows if row["layout_id"] is not None}))}
+    rows = [dict(row, layout_id=row["layout_id"] if row["layout_id"] in layouts else None)
+            for row in rows if row["quiz_id"] in quizzes and row["user_id"] in users]
+    if rows:
+        store_scores(rows)
+    conn.executemany("DELETE FROM pending WHERE attempt_key = ?", [(key,) for key, payload in items])
+    return len(items)
+
+def drain_score_queue():
+    while flush_score_queue() == app.config["SCORE_QUEUE_BATCH"]:
+        pass
+
+def start_score_writer():
+    start_background("score-writer", drain_score_queue, "SCORE_QUEUE_INTERVAL")
+
+@app.before_request
+def resume_score_writer():
+    # Picks up rows left queued by a previous run
+    if app.config["SCORE_WRITE_BEHIND"]:
+        start_score_writer()
+
+# Active quiz attempts
+
+def active_attempt_statement(user_id, quiz_id):
+    return select(Attempts).filter_by(user_id=user_id, quiz_id=quiz_id).limit(1)
+
+def active_attempt(user_id, quiz_id):
+    return db.session.scalar(active_attempt_statement(user_id, quiz_id))
+
+def attempt_closed(attempt):
+    # past the deadline and the grace period: no more autosaves, and a submit only grades what
+    # was saved in time
+    return datetime.now() > attempt.deadline + timedelta(seconds=app.config["SUBMIT_GRACE_SECONDS"])
+
+def grade_attempts(attempts):
+    # Grades attempts from their saved answers alone, as if submitted at the deadline, and
+    # deletes them. Scores are keyed by attempt, so a submit racing this stores one row.
+    rows, graded = [], [(attempt.id, attempt.user_id, attempt.quiz_id) for attempt in attempts]
+    for attempt in attempts:
+        key = answer_key(attempt.quiz_id)
+        if key:
+            answers = json.loads(attempt.answers)
+            answers.update(buffered_answers(attempt.user_id, attempt.quiz_id))
+            rows.append(score_row(attempt.user_id, attempt.quiz_id, attempt, key, answers, answer_layout(attempt.quiz_id, key)))
+    Attempts.query.filter(Attempts.id.in_([attempt_id for attempt_id, user_id, quiz_id in graded])) \
+        .delete(synchronize_session=False)
+    save_scores(rows)
+    for attempt_id, user_id, quiz_id in graded:
+        discard_buffered_answers(user_id, quiz_id)
+
+def grade_expired_attempts():
+    cutoff = datetime.now() - timedelta(seconds=app.config["SUBMIT_GRACE_SECONDS"])
+    while True:
+        attempts = Attempts.query.filter(Attempts.deadline < cutoff).order_by(Attempts.id) \
+            .limit(app.config["EXPIRED_ATTEMPTS_BATCH"]).all()
+        if not attempts:
+            return
+        grade_attempts(attempts)
+
+@app.before_request
+def start_attempt_grader():
+    start_background("attempt-grader", grade_expired_attempts, "EXPIRED_ATTEMPTS_INTERVAL")
+
+def live_attempts_count():
+    return Attempts.query.filter(Attempts.deadline >= datetime.now()).count()
+
+# Autosave of partial answers. Deltas posted to /autosave are coalesced per attempt in this
+# process and written to Attempts.answers every AUTOSAVE_FLUSH_INTERVAL seconds, or sooner once
+# AUTOSAVE_FLUSH_SIZE answers are waiting. json_patch merges in SQL, so concurrent flushes from
+# several workers never overwrite each other. A failed flush puts its answers back in the buffer.
+# An acknowledged answer may still only be buffered, so the final submit carries every answer
+# the page holds; the saved ones matter when that submit never arrives.
+
+AUTOSAVE_BUFFER = {}  # (user_id, quiz_id) -> {question id: option}
+autosave_lock = threading.Lock()
+
+def queue_answers(user_id, quiz_id, answers):
+    # Returns True once enough answers are waiting that the caller should flush now
+    with autosave_lock:
+        AUTOSAVE_BUFFER.setdefault((user_id, quiz_id), {}).update(answers)
+        waiting = sum(len(pending) for pending in AUTOSAVE_BUFFER.values())
+    start_background("autosave-writer", flush_autosaves, "AUTOSAVE_FLUSH_INTERVAL")
+    return waiting >= app.config["AUTOSAVE_FLUSH_SIZE"]
+
+def buffer_answers(user_id, quiz_id, answers):
+    if queue_answers(user_id, quiz_id, answers):
+        flush_autosaves()
+
+def autosave_answers(payload, key):
+    # {question id: option} from an autosave body, or None unless it only maps this quiz's
+    # question ids to options 1-4
+    answers = (payload or {}).get("answers") if isinstance(payload, dict) else None
+    fields = {field for field, correct in key}
+    if not isinstance(answers, dict) or not all(
+            field in fields and str(option) in ("1", "2", "3", "4") for field, option in answers.items()):
+        return None
+    return {field: str(option) for field, option in answers.items()}
+
+def buffered_answers(user_id, quiz_id):
+    with autosave_lock:
+        return dict(AUTOSAVE_BUFFER.get((user_id, quiz_id), {}))
+
+def discard_buffered_answers(user_id, quiz_id):
+    # Once the attempt is graded and gone; a flush would not find its row anyway
+    with autosave_lock:
+        AUTOSAVE_BUFFER.pop((user_id, quiz_id), None)
+
+def flush_autosaves():
+    with autosave_lock:
+        pending = list(AUTOSAVE_BUFFER.items())
+        AUTOSAVE_BUFFER.clear()
+    if not pending:
+        return
+    try:
+        db.session.execute(
+            db.text("UPDATE attempts SET answers = json_patch(answers, :delta) WHERE user_id = :user_id AND quiz_id = :quiz_id"),
+            [{"delta": json.dumps(answers), "user_id": user_id, "quiz_id": quiz_id}
+             for (user_id, quiz_id), answers in pending])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        with autosave_lock:
+            for attempt, answers in pending:
+                # answers posted since the flush began are newer
+                AUTOSAVE_BUFFER[attempt] = dict(answers, **AUTOSAVE_BUFFER.get(attempt, {}))
+        raise
+
+def saved_answers(attempt):
+    # Everything answered so far: stored answers plus what this process still buffers
+    answers = json.loads(attempt.answers)
+    with autosave_lock:
+        answers.update(AUTOSAVE_BUFFER.get((attempt.user_id, attempt.quiz_id), {}))
+    return answers
+
+# Item analysis batch job. Reads the packed answers of scores newer than the job's high-water
+# mark in batches of ITEM_STATS_BATCH, counts chosen options per question with NumPy and adds
+# them to question_stats. Each batch commits together with the new mark, and the mark only moves
+# if nobody else moved it first, so concurrent runs never count an attempt twice.
+# full=True starts over, e.g. after scores were deleted.
+
+def update_item_stats(full=False):
+    import reporting
+    with db.engine.begin() as conn:
+        conn.execute(sqlite_insert(JobProgress).on_conflict_do_nothing(), {"name": "item_stats", "last_id": 0})
+        if full:
+            conn.execute(QuestionStats.__table__.delete())
+            conn.execute(JobProgress.__table__.update().where(JobProgress.name == "item_stats").values(last_id=0))
+    processed = 0
+    while True:
+        with db.engine.begin() as conn:
+            last_id = conn.execute(db.select(JobProgress.last_id).where(JobProgress.name == "item_stats")).scalar()
+            rows = conn.execute(db.select(Scores.id, Scores.layout_id, Scores.answers)
+                                .where(Scores.id > last_id).order_by(Scores.id)
+                                .limit(app.config["ITEM_STATS_BATCH"])).all()
+            if not rows:
+                return processed
+            packed = [(layout_id, answers) for score_id, layout_id, answers in rows if layout_id is not None]
+            layouts = {layout_id: (quiz_id, question_ids.split(",")) for layout_id, quiz_id, question_ids in conn.execute(
+                db.select(AnswerLayouts.id, AnswerLayouts.quiz_id, AnswerLayouts.question_ids)
+                .where(AnswerLayouts.id.in_({layout_id for layout_id, answers in packed})))}
+            updates = []
+            for layout_id, counts in reporting.option_counts(packed).items():
+                quiz_id, question_ids = layouts[layout_id]
+                for question_id, (unanswered, *options) in zip(question_ids, counts.tolist()):
+                    updates.append({"question_id": int(question_id), "quiz_id": quiz_id,
+                                    "responses": unanswered + sum(options), "unanswered": unanswered,
+                                    "option_1": options[0], "option_2": options[1],
+                                    "option_3": options[2], "option_4": options[3]})
+            # questions deleted since these attempts were scored have nothing left to count into
+            existing = {question_id for (question_id,) in conn.execute(
+                db.select(Questions.id).where(Questions.id.in_({update["question_id"] for update in updates})))}
+            updates = [update for update in updates if update["question_id"] in existing]
+            if updates:
+                insert_stats = sqlite_insert(QuestionStats)
+                conn.execute(insert_stats.on_conflict_do_update(
+                    index_elements=["question_id"],
+                    set_={column: getattr(QuestionStats, column) + getattr(insert_stats.excluded, column)
+                          for column in ("responses", "unanswered", "option_1", "option_2", "option_3", "option_4")}),
+                    updates)
+            moved = conn.execute(JobProgress.__table__.update()
+                                 .where(JobProgress.name == "item_stats", JobProgress.last_id == last_id)
+                                 .values(last_id=rows[-1][0], updated_at=datetime.now()))
+            if moved.rowcount != 1:
+                raise RuntimeError("item_stats progress moved by another run, batch discarded")
+        processed += len(rows)
+
+# Subtree deletes. The database cascades a subject, chapter, quiz or user delete to everything
+# below it (ON DELETE CASCADE with passive_deletes, so nothing is loaded into the session), and
+# the stats triggers drop the subtree's scores first. Scores are the only part that grows large:
+# a subtree with more than BACKGROUND_DELETE_THRESHOLD of them is emptied by a background
+# thread, DELETE_CHUNK_SIZE scores per transaction, before its root row is deleted.
+
+SUBTREE_ROOTS = {"subject": Subjects, "chapter": Chapters, "quiz": Quizzes, "user": Users}
+SUBTREE_SCORES = {
+    "subject": "SELECT scores.id FROM scores JOIN quizzes ON quizzes.id = scores.quiz_id "
+               "JOIN chapters ON chapters.id = quizzes.chapter_id WHERE chapters.subject_id = :id",
+    "chapter": "SELECT scores.id FROM scores JOIN quizzes ON quizzes.id = scores.quiz_id WHERE quizzes.chapter_id = :id",
+    "quiz": "SELECT id FROM scores WHERE quiz_id = :id",
+    "user": "SELECT id FROM scores WHERE user_id = :id",
+}
+PENDING_DELETES = set()  # (kind, id) being deleted by this process
+delete_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="delete")
+
+def delete_root(kind, root_id):
+    model = SUBTREE_ROOTS[kind]
+    db.session.execute(db.delete(model).where(model.id == root_id))
+    db.session.commit()
+    # a bulk delete bypasses the ORM change tracking that drops cached quizzes
+    invalidate_all_quiz_caches()
+
+def delete_subtree_in_chunks(kind, root_id):
+    try:
+        with app.app_context():
+            chunk = app.config["DELETE_CHUNK_SIZE"]
+            while True:
+                deleted = db.session.execute(db.text(f"DELETE FROM scores WHERE id IN ({SUBTREE_SCORES[kind]} LIMIT :chunk)"),
+                                             {"id": root_id, "chunk": chunk}).rowcount
+                db.session.commit()
+                if deleted < chunk:
+                    break
+            delete_root(kind, root_id)
+    except Exception:
+        app.logger.exception("Deleting %s %s failed", kind, root_id)
+    finally:
+        PENDING_DELETES.discard((kind, root_id))
+
+def delete_subtree(kind, root_id):
+    # True when the subtree is gone, False when it is (still) being deleted in the background
+    if (kind, root_id) in PENDING_DELETES:
+        return False
+    threshold = app.config["BACKGROUND_DELETE_THRESHOLD"]
+    scores = db.session.execute(db.text(f"SELECT count(*) FROM ({SUBTREE_SCORES[kind]} LIMIT :limit)"),
+                                {"id": root_id, "limit": threshold + 1}).scalar()
+    if scores <= threshold:
+        delete_root(kind, root_id)
+        return True
+    PENDING_DELETES.add((kind, root_id))
+    delete_pool.submit(delete_subtree_in_chunks, kind, root_id)
+    return False
+
+@app.cli.command("delete-subtree")
+@click.argument("kind", type=click.Choice(sorted(SUBTREE_ROOTS)))
+@click.argument("root_id", type=int)
+def delete_subtree_command(kind, root_id):
+    # Always chunked, in the foreground
+    PENDING_DELETES.add((kind, root_id))
+    delete_subtree_in_chunks(kind, root_id)
+
+@app.cli.command("item-stats")
+@click.option("--full", is_flag=True, help="Recount every stored attempt from scratch.")
+def item_stats_command(full):
+    print(f"{update_item_stats(full)} scores processed")
+
 # Helper function to create admin user
+# Password hashing. hashlib's scrypt and pbkdf2 release the GIL, so a thread pool is enough to
+# keep the hashing off the request threads' Python time; the semaphore bounds how many logins
+# may wait on it at once.
+
+PASSWORD_HASH = re.compile(r"^(?:scrypt|pbkdf2):[^$]+\$[^$]+\$[0-9a-f]+$")
+password_slots = threading.BoundedSemaphore(app.config["PASSWORD_HASH_QUEUE"])
+password_pool = ThreadPoolExecutor(max_workers=app.config["PASSWORD_HASH_WORKERS"], thread_name_prefix="password")
+
+def hash_password(password):
+    return generate_password_hash(password, method=app.config["PASSWORD_HASH_METHOD"])
+
+def check_password(stored, password):
+    # Returns (matches, new hash or None); a new hash is made for legacy plain-text rows and
+    # for hashes made with a method other than PASSWORD_HASH_METHOD. An unknown user (stored is
+    # None) still pays for one hash, so a miss takes as long as a wrong password.
+    if stored is None:
+        hash_password(password)
+        return False, None
+    if not PASSWORD_HASH.match(stored):
+        if not hmac.compare_digest(stored.encode(), password.encode()):
+            return False, None
+        return True, hash_password(password)
+    if not check_password_hash(stored, password):
+        return False, None
+    if stored.split("$", 1)[0] != app.config["PASSWORD_HASH_METHOD"]:
+        return True, hash_password(password)
+    return True, None
+
+def run_password_task(fn, *args):
+    # Runs fn in the password pool; returns None when too many are already waiting or the
+    # result does not come within PASSWORD_HASH_TIMEOUT
+    if not password_slots.acquire(blocking=False):
+        return None
+    try:
+        future = password_pool.submit(fn, *args)
+    except BaseException:
+        password_slots.release()
+        raise
+    future.add_done_callback(lambda f: password_slots.release())
+    try:
+        return future.result(timeout=app.config["PASSWORD_HASH_TIMEOUT"])
+    except FutureTimeoutError:
+        app.logger.warning("Password hash not done within %ss", app.config["PASSWORD_HASH_TIMEOUT"])
+        return None
+
+def password_busy():
+    flash("Too many sign-ins right now, please try again in a moment.", "warning")
+    response = make_response(render_template('login.html'), 503)
+    response.headers["Retry-After"] = "2"
+    return response
+
+@app.cli.command("rehash-passwords")
+@click.option("--batch", default=500, show_default=True, help="Users read per transaction.")
+def rehash_passwords_command(batch):
+    # Hashes every password still stored in plain text without waiting for those users to log in
+    done, last_id = 0, 0
+    while True:
+        rows = db.session.query(Users.id, Users.password).filter(Users.id > last_id) \
+            .order_by(Users.id).limit(batch).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        legacy = [row for row in rows if not PASSWORD_HASH.match(row.password)]
+        for row, hashed in zip(legacy, password_pool.map(hash_password, [row.password for row in legacy])):
+            db.session.query(Users).filter_by(id=row.id, password=row.password).update({"password": hashed})
+        db.session.commit()
+        done += len(legacy)
+    print(f"{done} passwords rehashed")
+
 def create_admin():
     admin_user = Users.query.filter_by(email="admin@gmail.com").first()
     if not admin_user:
         admin = Users(
             name="Admin",
             email="admin@gmail.com",
-            password="0000",
+            password=hash_password("0000"),
             qualification="BS Data Science, IIT Madras",
             dob=datetime(2000, 1, 1).date(),
             is_admin=True
@@ -110,9 +1670,18 @@ def login():
     if request.method == 'POST':
         email = request.form['email']
         password = request.form['password']
-        user = Users.query.filter_by(email=email).first()
-        
-        if user and user.password == password:
+        user = db.session.query(Users.id, Users.password, Users.is_admin).filter_by(email=email).first()
+        # Hand the connection back to the pool before waiting on the hash
+        db.session.rollback()
+        result = run_password_task(check_password, user.password if user else None, password)
+        if result is None:
+            return password_busy()
+        matches, new_hash = result
+
+        if user and matches:
+            if new_hash:
+                db.session.query(Users).filter_by(id=user.id, password=user.password).update({"password": new_hash})
+                db.session.commit()
             session['admin' if user.is_admin else 'user'] = user.id
             if user.is_admin:
                 return redirect(url_for('admin_dashboard'))
@@ -124,15 +1693,20 @@ def login():
     return render_template('login.html')
 
 @app.route('/admin')
+@query_budget(6)
 def admin_dashboard():
     if 'admin' in session:
         subjects = Subjects.query.all()
-        scores = Scores.query.order_by(Scores.timestamp.desc()).limit(50).all()
+        scores = Scores.query.options(
+            joinedload(Scores.user),
+            joinedload(Scores.quiz).joinedload(Quizzes.chapter).joinedload(Chapters.subject),
+        ).order_by(Scores.timestamp.desc()).limit(50).all()
         users_count = Users.query.filter_by(is_admin=False).count()
         quizzes_count = Quizzes.query.count()
         return render_template('admin_dashboard.html', 
                              all_subjects=subjects, 
                              scores=scores,
+                             live_attempts=live_attempts_count(),
                              users_count=users_count,
                              quizzes_count=quizzes_count)
     return redirect(url_for('login'))
@@ -142,8 +1716,8 @@ def admin_dashboard():
 def view_subject(subject_id):
     if 'admin' in session:
         subject = Subjects.query.filter_by(id=subject_id).first()
-        chapters = Chapters.query.filter_by(subject_id=subject_id).all()
-        return render_template('view_subject.html', subject=subject, chapters=chapters)
+        chapters, next_cursor = keyset_page(Chapters.query.filter_by(subject_id=subject_id), Chapters.id)
+        return render_template('view_subject.html', subject=subject, chapters=chapters, next_cursor=next_cursor)
     return redirect(url_for('login'))
 
 
@@ -151,8 +1725,8 @@ def view_subject(subject_id):
 def view_chapter(chapter_id):
     if 'admin' in session:
         chapter = Chapters.query.filter_by(id=chapter_id).first()
-        quizzes = Quizzes.query.filter_by(chapter_id=chapter_id).all()
-        return render_template('view_chapter.html', chapter=chapter, quizzes=quizzes)
+        quizzes, next_cursor = keyset_page(Quizzes.query.filter_by(chapter_id=chapter_id), Quizzes.id)
+        return render_template('view_chapter.html', chapter=chapter, quizzes=quizzes, next_cursor=next_cursor)
     return redirect(url_for('login'))
 
 
@@ -160,8 +1734,12 @@ def view_chapter(chapter_id):
 def view_quiz(quiz_id):
     if 'admin' in session:
         quiz = Quizzes.query.filter_by(id=quiz_id).first()
-        questions = Questions.query.filter_by(quiz_id=quiz_id).all()
-        return render_template('view_quiz.html', quiz=quiz, questions=questions)
+        questions, next_cursor = keyset_page(Questions.query.filter_by(quiz_id=quiz_id), Questions.id)
+        item_stats = {stats.question_id: stats for stats in QuestionStats.query.filter(
+            QuestionStats.question_id.in_([que.id for que in questions]))}
+        item_stats_run = db.session.get(JobProgress, "item_stats")
+        return render_template('view_quiz.html', quiz=quiz, questions=questions, next_cursor=next_cursor,
+                               item_stats=item_stats, item_stats_run=item_stats_run)
     return redirect(url_for('login'))
 
 @app.route('/create_subject', methods=['GET', 'POST'])
@@ -212,12 +1790,13 @@ def delete_subject(subject_id):
     if 'admin' not in session:
         return redirect(url_for('login'))
 
-    subject = Subjects.query.get(subject_id)
+    subject = db.session.get(Subjects, subject_id)
     # if request.method == 'POST':
-    db.session.delete(subject)
-    db.session.commit()
-    return redirect(url_for('admin_dashboard'))
-    flash("Subject deleted successfully!", "success")
+    if subject:
+        if delete_subtree("subject", subject_id):
+            flash("Subject deleted successfully!", "success")
+        else:
+            flash("This subject has a long score history; it is being deleted in the background.", "info")
     
     return redirect(url_for('admin_dashboard'))
 
@@ -269,15 +1848,15 @@ def edit_chapter(chapter_id):
 @app.route('/delete_chapter/<int:chapter_id>', methods = ['GET','POST'])
 def delete_chapter(chapter_id):
     if 'admin' in session:
-        chapter = Chapter.query.filter_by(id=chapter_id).first()
+        chapter = Chapters.query.filter_by(id=chapter_id).first()
         if not chapter:
              return redirect('/admin')
         
         if request.method == 'POST':
-            Subject_id = chapter.Subject_id
-            db.session.delete(chapter)
-            db.session.commit()
-            return redirect(url_for('view_subject', subject_id=chapter.Subject_id))
+            subject_id = chapter.subject_id
+            if not delete_subtree("chapter", chapter_id):
+                flash("This chapter has a long score history; it is being deleted in the background.", "info")
+            return redirect(url_for('view_subject', subject_id=subject_id))
         return render_template('del_confirm.html', chapter=chapter)
     return redirect('/login')
 
@@ -336,8 +1915,8 @@ def delete_quiz(quiz_id):
         
         # if request.method == 'POST':
         chapter_id = quiz.chapter_id
-        db.session.delete(quiz)
-        db.session.commit()
+        if not delete_subtree("quiz", quiz_id):
+            flash("This quiz has a long score history; it is being deleted in the background.", "info")
         return redirect(url_for('view_chapter', chapter_id=chapter_id))
         # return render_template('del_confirm.html', quiz=quiz)
     return redirect('/login')
@@ -355,7 +1934,11 @@ def register():
 
         try:
             dob = datetime.strptime(dob_str, "%Y-%m-%d").date()
-            new_user = Users(name=name, email=email, password=password, qualification=qualification, dob=dob)
+            hashed = run_password_task(hash_password, password)
+            if hashed is None:
+                flash("Too many sign-ups right now, please try again in a moment.", "warning")
+                return make_response(render_template('register.html'), 503)
+            new_user = Users(name=name, email=email, password=hashed, qualification=qualification, dob=dob)
             db.session.add(new_user)
             db.session.commit()
             flash("Registration successful!", "success")
@@ -441,6 +2024,203 @@ def delete_question(question_id):
     return redirect('/login')
                 
 
+# Bulk import / export of questions
+# CSV and JSON Lines share one flat row format, so an export can be imported again as is.
+# Importing into a quiz only needs the question columns; a global import also reads the
+# subject/chapter/quiz columns and creates any part of the tree that does not exist yet.
+
+QUESTION_FIELDS = ["question_text", "option_1", "option_2", "option_3", "option_4", "correct_answer"]
+TREE_FIELDS = ["subject", "chapter", "quiz", "date_of_quiz", "time_duration", "remarks"]
+
+def upload_lines(upload, failed):
+    # Decodes the upload a line at a time and stops at the first line that is not UTF-8,
+    # recording its number in `failed`
+    for number, line in enumerate(upload.stream, start=1):
+        try:
+            yield line.decode("utf-8-sig" if number == 1 else "utf-8")
+        except UnicodeDecodeError:
+            failed.append(number)
+            return
+
+def read_upload(upload):
+    # Yields (line number, row) one row at a time; bad JSON lines come through as None, and a
+    # line that cannot be read as a ValueError saying why, which ends the upload
+    failed = []
+    lines = upload_lines(upload, failed)
+    if upload.filename.lower().endswith((".jsonl", ".json")):
+        for number, line in enumerate(lines, start=1):
+            if line.strip():
+                try:
+                    yield number, json.loads(line)
+                except ValueError:
+                    yield number, None
+    else:
+        reader = csv.DictReader(lines)
+        try:
+            for row in reader:
+                yield reader.line_num, row
+        except csv.Error as e:
+            # DictReader.line_num only moves on once a row parses
+            yield reader.reader.line_num, ValueError(f"not a valid CSV file ({e}), the rest of the file was skipped")
+            return
+    if failed:
+        yield failed[0], ValueError("not UTF-8 text, the rest of the file was skipped")
+
+def clean_field(row, field):
+    value = str(row.get(field) or "").strip()
+    if not value:
+        raise ValueError(f"{field} is required")
+    return value
+
+def clean_question(row):
+    if isinstance(row, ValueError):
+        raise row
+    if not isinstance(row, dict):
+        raise ValueError("row is not a valid JSON object")
+    values = {field: clean_field(row, field) for field in QUESTION_FIELDS[:-1]}
+    correct = str(row.get("correct_answer") or "").strip()
+    if correct not in ("1", "2", "3", "4"):
+        raise ValueError("correct_answer must be 1, 2, 3 or 4")
+    values["correct_answer"] = int(correct)
+    return values
+
+def resolve_quiz(row, known):
+    # Finds or creates the subject -> chapter -> quiz path of a row; `known` caches ids per import
+    subject_name, chapter_name, quiz_name = (clean_field(row, field) for field in TREE_FIELDS[:3])
+    key = (subject_name, chapter_name, quiz_name)
+    if key in known:
+        return known[key]
+    subject_id = known.get((subject_name,))
+    if subject_id is None:
+        subject = Subjects.query.filter_by(name=subject_name).first()
+        if not subject:
+            subject = Subjects(name=subject_name, description=subject_name)
+            db.session.add(subject)
+            db.session.flush()
+        subject_id = known[(subject_name,)] = subject.id
+    chapter_id = known.get((subject_name, chapter_name))
+    if chapter_id is None:
+        chapter = Chapters.query.filter_by(subject_id=subject_id, name=chapter_name).first()
+        if not chapter:
+            chapter = Chapters(name=chapter_name, description=chapter_name, subject_id=subject_id)
+            db.session.add(chapter)
+            db.session.flush()
+        chapter_id = known[(subject_name, chapter_name)] = chapter.id
+    quiz = Quizzes.query.filter_by(chapter_id=chapter_id, name=quiz_name).first()
+    if not quiz:
+        try:
+            doq = datetime.strptime(clean_field(row, "date_of_quiz"), '%Y-%m-%d').date()
+            duration = int(clean_field(row, "time_duration"))
+        except ValueError:
+            raise ValueError("a new quiz needs date_of_quiz (YYYY-MM-DD) and time_duration (minutes)")
+        quiz = Quizzes(name=quiz_name, date_of_quiz=doq, time_duration=duration,
+                       remarks=str(row.get("remarks") or ""), chapter_id=chapter_id)
+        db.session.add(quiz)
+        db.session.flush()
+    known[key] = quiz.id
+    return quiz.id
+
+def import_questions(rows, quiz_id=None):
+    # Inserts valid rows with executemany batches, one transaction per batch.
+    # Returns (inserted count, [(line number, error)]).
+    batch_size = app.config["IMPORT_BATCH_SIZE"]
+    known = {}
+    touched = set()
+    batch = []
+    inserted = 0
+    errors = []
+    for number, row in rows:
+        try:
+            values = clean_question(row)
+            values["quiz_id"] = quiz_id if quiz_id is not None else resolve_quiz(row, known)
+        except ValueError as e:
+            if len(errors) < app.config["IMPORT_MAX_ERRORS"]:
+                errors.append((number, str(e)))
+            continue
+        batch.append(values)
+        touched.add(values["quiz_id"])
+        if len(batch) >= batch_size:
+            db.session.execute(insert(Questions), batch)
+            db.session.commit()
+            inserted += len(batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(Questions), batch)
+        inserted += len(batch)
+    db.session.commit()
+    # Core inserts skip the ORM flush hooks, so drop the cached quizzes here
+    for touched_id in touched:
+        invalidate_quiz_caches(touched_id)
+    return inserted, errors
+
+def export_rows(quiz_id=None):
+    query = db.select(Subjects.name, Chapters.name, Quizzes.name, Quizzes.date_of_quiz,
+                      Quizzes.time_duration, Quizzes.remarks, Questions.question_text,
+                      Questions.option_1, Questions.option_2, Questions.option_3,
+                      Questions.option_4, Questions.correct_answer) \
+        .join_from(Questions, Quizzes, Questions.quiz_id == Quizzes.id) \
+        .join(Chapters, Quizzes.chapter_id == Chapters.id) \
+        .join(Subjects, Chapters.subject_id == Subjects.id) \
+        .order_by(Questions.id)
+    if quiz_id is not None:
+        query = query.where(Questions.quiz_id == quiz_id)
+    for row in db.session.execute(query.execution_options(yield_per=app.config["IMPORT_BATCH_SIZE"])):
+        row = list(row)
+        row[3] = row[3].isoformat()
+        yield row
+
+def export_chunks(rows, fmt):
+    # Groups serialized rows into chunks so the response streams without one write per row
+    fields = TREE_FIELDS + QUESTION_FIELDS
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if fmt == "csv":
+        writer.writerow(fields)
+    for count, row in enumerate(rows, start=1):
+        if fmt == "csv":
+            writer.writerow(row)
+        else:
+            buffer.write(json.dumps(dict(zip(fields, row))) + "\n")
+        if count % app.config["IMPORT_BATCH_SIZE"] == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+@app.route('/import_questions', defaults={'quiz_id': None}, methods=['POST'])
+@app.route('/import_questions/<int:quiz_id>', methods=['POST'])
+def bulk_import_questions(quiz_id):
+    if 'admin' not in session:
+        return redirect(url_for('login'))
+
+    back = url_for('view_quiz', quiz_id=quiz_id) if quiz_id is not None else url_for('admin_dashboard')
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        flash("Choose a CSV or JSON Lines file to import!", "danger")
+        return redirect(back)
+    if quiz_id is not None and not db.session.get(Quizzes, quiz_id):
+        flash("Quiz not found!", "danger")
+        return redirect(url_for('admin_dashboard'))
+
+    inserted, errors = import_questions(read_upload(upload), quiz_id)
+    flash(f"Imported {inserted} questions.", "success" if inserted else "warning")
+    for number, error in errors:
+        flash(f"Line {number}: {error}", "danger")
+    return redirect(back)
+
+@app.route('/export_questions')
+def bulk_export_questions():
+    if 'admin' not in session:
+        return redirect(url_for('login'))
+
+    quiz_id = request.args.get('quiz_id', type=int)
+    fmt = "jsonl" if request.args.get('format') == "jsonl" else "csv"
+    mimetype = "application/x-ndjson" if fmt == "jsonl" else "text/csv"
+    filename = f"questions_{quiz_id}.{fmt}" if quiz_id is not None else f"questions.{fmt}"
+    return Response(stream_with_context(export_chunks(export_rows(quiz_id), fmt)), mimetype=mimetype,
+                    headers={"Content-Disposition": f"attachment; filename={filename}"})
+
+
 @app.route('/user_logout')
 def user_logout():
     session.pop('user')
@@ -450,14 +2230,24 @@ def user_logout():
 #creating user dashboard for showcasing all the quizzes
 
 @app.route('/user')
+@query_budget(6)
 def user_dashboard():
     if 'user' in session:
-        quizzes = Quizzes.query.all()
+        quizzes, next_cursor = keyset_page(
+            Quizzes.query.options(joinedload(Quizzes.chapter).joinedload(Chapters.subject)), Quizzes.id)
+        question_counts = dict(db.session.query(Questions.quiz_id, func.count(Questions.id))
+                               .filter(Questions.quiz_id.in_([quiz.id for quiz in quizzes]))
+                               .group_by(Questions.quiz_id).all())
         user = Users.query.filter_by(id=session['user']).first()
+        quizzes_count = Quizzes.query.count()
         subjects_count = Subjects.query.count()
-        attempted_count = Scores.query.filter_by(user_id=session['user']).count()
+        user_stats = db.session.get(UserStats, session['user'])
+        attempted_count = user_stats.attempts if user_stats else 0
         return render_template('user_dashboard.html', 
                              quizzes=quizzes, 
+                             next_cursor=next_cursor,
+                             quizzes_count=quizzes_count,
+                             question_counts=question_counts,
                              user=user,
                              subjects_count=subjects_count,
                              attempted_count=attempted_count)
@@ -473,7 +2263,6 @@ def user_dashboard():
 def start_quiz(quiz_id):
     if 'user' in session:
         quiz = Quizzes.query.filter_by(id=quiz_id).first()
-        questions = Questions.query.filter_by(quiz_id=quiz_id).all()
 
         # Ensure quiz exists
         if not quiz:
@@ -486,12 +2275,21 @@ def start_quiz(quiz_id):
             return redirect("/user")
 
         # Check if quiz has questions
-        if not questions:
+        if not answer_key(quiz_id):
             flash("No questions found for this quiz!", "info")
             return redirect("/user")
 
-        # Store timestamp in session
-        session["timestamp"] = datetime.now().isoformat()
+        # Reopening a running attempt keeps its clock; one past its deadline is graded from
+        # its saved answers and a new one started
+        attempt = active_attempt(session['user'], quiz_id)
+        if attempt and attempt_closed(attempt):
+            grade_attempts([attempt])
+            attempt = None
+        if not attempt:
+            now = datetime.now()
+            db.session.add(Attempts(user_id=session['user'], quiz_id=quiz_id, started_at=now,
+                                    deadline=now + timedelta(minutes=quiz.time_duration)))
+        db.session.commit()
 
         return redirect(f"/quiz/{quiz_id}")
 
@@ -505,10 +2303,16 @@ def start_quiz(quiz_id):
 @app.route('/quiz/<int:quiz_id>', methods=['GET', 'POST'])
 def quiz_page(quiz_id):
     if 'user' in session:
-        quiz = Quizzes.query.filter_by(id=quiz_id).first()
-        questions = Questions.query.filter_by(quiz_id=quiz_id).all()
-        user = Users.query.filter_by(id=session['user']).first()
-        return render_template('quiz.html', quiz=quiz, questions=questions, user=user)
+        attempt = active_attempt(session['user'], quiz_id)
+        if not attempt:
+            return redirect(f"/start_quiz/{quiz_id}")
+        quiz_body = quiz_fragment(quiz_id)
+        if quiz_body is None:
+            flash("Quiz not found!", "warning")
+            return redirect("/user")
+        remaining_seconds = max(int((attempt.deadline - datetime.now()).total_seconds()), 0)
+        return render_template('quiz.html', quiz_body=quiz_body, remaining_seconds=remaining_seconds,
+                               saved_answers=saved_answers(attempt))
     return redirect('/login')
 
 
@@ -518,21 +2322,24 @@ def quiz_page(quiz_id):
 @app.route('/submit_quiz/<int:quiz_id>', methods=['POST'])
 def submit_quiz(quiz_id):
     if 'user' in session:
-        questions = Questions.query.filter_by(quiz_id=quiz_id).all()
-        user = Users.query.filter_by(id=session['user']).first()
-        score = 0
-        tot_score = 0
-        for question in questions:
-            # print("hhhhhhhhhhhh ----", type(question.correct_answer) , type(request.form[str(question.id)] ) )
-            if request.form[str(question.id)] == str(question.correct_answer):
-                score += 1
-            tot_score += 1
-        
-        new_score = Scores(score=score,total_scored=tot_score, user_id=user.id, quiz_id=quiz_id, timestamp=datetime.fromisoformat(session['timestamp']))
-        db.session.add(new_score)
-        db.session.commit()
+        attempt = active_attempt(session['user'], quiz_id)
+        if not attempt:
+            flash("This quiz was not started or has already been submitted.", "warning")
+            return redirect("/user")
+        # Autosaved answers plus whatever the final submit carries, unless it came too late
+        answers = json.loads(attempt.answers)
+        answers.update(buffered_answers(session['user'], quiz_id))
+        if attempt_closed(attempt):
+            flash("Time is up, only the answers saved before the deadline were graded.", "danger")
+        else:
+            answers.update(request.form.to_dict())
+        key = answer_key(quiz_id)
+        new_score = score_row(session['user'], quiz_id, attempt, key, answers, answer_layout(quiz_id, key))
+        db.session.delete(attempt)
+        save_scores([new_score])
+        discard_buffered_answers(session['user'], quiz_id)
 
-        return render_template('result.html',score=score, total_score=tot_score, user=user)
+        return render_template('result.html', score=new_score["score"], total_score=new_score["total_scored"], quiz_id=quiz_id)
 
 
  
@@ -549,76 +2356,232 @@ def submit_quiz(quiz_id):
     
 
 
+@app.route('/autosave/<int:quiz_id>', methods=['POST'])
+def autosave(quiz_id):
+    # Body: {"answers": {"<question id>": "<option>", ...}} with the answers changed since the last save
+    if 'user' not in session:
+        return jsonify({"error": "not logged in"}), 401
+    attempt = active_attempt(session['user'], quiz_id)
+    if not attempt or attempt_closed(attempt):
+        return jsonify({"error": "no active attempt"}), 409
+    answers = autosave_answers(request.get_json(silent=True), answer_key(quiz_id))
+    if answers is None:
+        return jsonify({"error": "answers must map question ids of this quiz to options 1-4"}), 400
+    buffer_answers(session['user'], quiz_id, answers)
+    return jsonify({"saved": len(answers)})
+
+
+
+# Leaderboards: top LEADERBOARD_SIZE users of a quiz, chapter or subject plus the viewer's own rank.
+# Ties share a rank (1, 2, 2, 4).
+
+LEADERBOARD_SCOPES = {"quiz": Quizzes, "chapter": Chapters, "subject": Subjects}
+
+def leaderboard_top(scope, scope_id, limit):
+    return db.session.query(Leaderboard.user_id, Users.name, Leaderboard.points, Leaderboard.quizzes) \
+        .join(Users, Users.id == Leaderboard.user_id) \
+        .filter(Leaderboard.scope == scope, Leaderboard.scope_id == scope_id) \
+        .order_by(Leaderboard.points.desc(), Leaderboard.user_id).limit(limit).all()
+
+def leaderboard_rank(scope, scope_id, user_id):
+    # (rank, points), or None when the user has not attempted anything in the scope
+    entry = db.session.get(Leaderboard, (scope, scope_id, user_id))
+    if entry is None:
+        return None
+    ahead = db.session.query(func.coalesce(func.sum(LeaderboardPoints.users), 0)) \
+        .filter(LeaderboardPoints.scope == scope, LeaderboardPoints.scope_id == scope_id,
+                LeaderboardPoints.points > entry.points).scalar()
+    return ahead + 1, entry.points
+
+def leaderboard_size(scope, scope_id):
+    return db.session.query(func.coalesce(func.sum(LeaderboardPoints.users), 0)) \
+        .filter(LeaderboardPoints.scope == scope, LeaderboardPoints.scope_id == scope_id).scalar()
+
+@app.route('/leaderboard/<scope>/<int:scope_id>')
+def leaderboard(scope, scope_id):
+    if 'user' not in session and 'admin' not in session:
+        return redirect('/login')
+    model = LEADERBOARD_SCOPES.get(scope)
+    if model is None:
+        abort(404)
+    target = db.session.get(model, scope_id)
+    if target is None:
+        abort(404)
+    top = leaderboard_top(scope, scope_id, app.config["LEADERBOARD_SIZE"])
+    # shared ranks for the top rows: one more than the number of rows on more points
+    ranks, previous = [], None
+    for position, row in enumerate(top, start=1):
+        ranks.append(ranks[-1] if previous == row.points else position)
+        previous = row.points
+    mine = leaderboard_rank(scope, scope_id, session['user']) if 'user' in session else None
+    return render_template('leaderboard.html', scope=scope, target=target, rows=list(zip(ranks, top)),
+                           mine=mine, participants=leaderboard_size(scope, scope_id))
+
 #creating user/history route to show all the previous attempted quizzes to thr user
 
 @app.route('/user/history')
 def user_history():
     if 'user' in session:
         user = Users.query.filter_by(id=session['user']).first()
-        scores = Scores.query.filter_by(user_id=user.id).all()
-        return render_template('history.html', scores=scores, user=user)
+        scores, next_cursor = keyset_page(
+            Scores.query.filter_by(user_id=user.id).options(
+                joinedload(Scores.quiz).joinedload(Quizzes.chapter).joinedload(Chapters.subject)),
+            Scores.timestamp, Scores.id, descending=True)
+        stats = db.session.get(UserStats, user.id) or UserStats(attempts=0, total_correct=0, total_possible=0, best_score=0)
+        return render_template('history.html', scores=scores, user=user, stats=stats, next_cursor=next_cursor)
     return redirect('/login')
 
 
 
 
-#craeting routee for admin search for users, subjects, chapters and quizzes based on their names
+#craeting routee for admin search for users, subjects, chapters, quizzes and questions
 
 @app.route('/admin/search', methods=['GET'])
 def admin_search():
-    search_query = request.args.get('query', '')  # Use request.args for GET requests
-    if not search_query:
-        return render_template("admin_search.html", users=[], subjects=[], chapters=[], quizzes=[])
+    if 'admin' not in session:
+        return redirect(url_for('login'))
 
-    # Implement your search logic here
-    users = Users.query.filter(Users.name.ilike(f"%{search_query}%")).all()
-    subjects = Subjects.query.filter(Subjects.name.ilike(f"%{search_query}%")).all()
-    chapters = Chapters.query.filter(Chapters.name.ilike(f"%{search_query}%")).all()
-    quizzes = Quizzes.query.filter(Quizzes.name.ilike(f"%{search_query}%")).all()
+    search_query = request.args.get('query', '')  # Use request.args for GET requests
+    page = max(request.args.get('page', 1, type=int), 1)
+    results, has_next = search(search_query, page)
+    return render_template("admin_search.html", query=search_query, results=results, page=page, has_next=has_next)
 
-    return render_template("admin_search.html", users=users, subjects=subjects, chapters=chapters, quizzes=quizzes)
-    
 
 
 #creating route for admin summary to show no of quizzes in each subject in bargraph, and showing subject wise user attempts in pie chart
 
+# chart name -> (data version, png bytes); a chart is only redrawn when its data changes
+SUMMARY_CHARTS = {}
+# (chart name, data version) -> Future, so concurrent requests share one render
+PENDING_CHARTS = {}
+chart_lock = threading.RLock()
+chart_slots = threading.BoundedSemaphore(app.config["CHART_RENDER_QUEUE"])
+chart_pool = ThreadPoolExecutor(max_workers=app.config["CHART_RENDER_WORKERS"], thread_name_prefix="chart")
+
+def summary_data():
+    quizzes_per_subject = db.session.query(Subjects.name, func.count(Quizzes.id)) \
+        .outerjoin(Chapters, Chapters.subject_id == Subjects.id) \
+        .outerjoin(Quizzes, Quizzes.chapter_id == Chapters.id) \
+        .group_by(Subjects.id).order_by(Subjects.id).all()
+    attempts_per_user = db.session.query(Users.name, UserStats.attempts) \
+        .join(UserStats, UserStats.user_id == Users.id) \
+        .order_by(Users.id).all()
+    return {
+        "quizzes_per_subject": [tuple(row) for row in quizzes_per_subject],
+        "attempts_per_user": [tuple(row) for row in attempts_per_user],
+    }
+
+def data_version(rows):
+    return hashlib.sha1(repr(rows).encode()).hexdigest()[:16]
+
+def render_chart(name, rows):
+    # The plotting stack is only imported when the first chart is drawn
+    import reporting
+    return reporting.render_chart(name, rows)
+
+def finish_chart(name, version, future):
+    chart_slots.release()
+    with chart_lock:
+        PENDING_CHARTS.pop((name, version), None)
+        if future.exception() is None:
+            SUMMARY_CHARTS[name] = (version, future.result())
+
+def cached_chart(name, rows):
+    # Returns (version, png), or None when the render pool is saturated or the chart is not
+    # drawn within CHART_RENDER_TIMEOUT; it is still cached once the render finishes
+    version = data_version(rows)
+    with chart_lock:
+        cached = SUMMARY_CHARTS.get(name)
+        if cached is not None and cached[0] == version:
+            return cached
+        future = PENDING_CHARTS.get((name, version))
+        if future is None:
+            if not chart_slots.acquire(blocking=False):
+                return None
+            future = chart_pool.submit(render_chart, name, rows)
+            PENDING_CHARTS[(name, version)] = future
+            future.add_done_callback(lambda f: finish_chart(name, version, f))
+    try:
+        return version, future.result(timeout=app.config["CHART_RENDER_TIMEOUT"])
+    except FutureTimeoutError:
+        app.logger.warning("Chart %s not rendered within %ss", name, app.config["CHART_RENDER_TIMEOUT"])
+        return None
+
+@app.route('/admin/live_attempts')
+def admin_live_attempts():
+    # Attempts in progress right now, overall and for the busiest quizzes
+    if 'admin' not in session:
+        return redirect('/login')
+    by_quiz = db.session.query(Quizzes.id, Quizzes.name, func.count(Attempts.id)) \
+        .join(Attempts, Attempts.quiz_id == Quizzes.id) \
+        .filter(Attempts.deadline >= datetime.now()) \
+        .group_by(Quizzes.id).order_by(func.count(Attempts.id).desc()).limit(20).all()
+    return jsonify({
+        "live": live_attempts_count(),
+        "by_quiz": [{"quiz_id": quiz_id, "name": name, "live": live} for quiz_id, name, live in by_quiz],
+    })
+
+# Cohort analytics (quiz difficulty, subject percentiles, score distribution, user ranking)
+# computed column-wise with NumPy in reporting.cohort_report. A report over millions of
+# scores takes seconds, so the last one is kept until the scores change.
+COHORT_REPORT = {}
+cohort_lock = threading.Lock()
+
+def cohort_version():
+    totals = db.session.query(func.sum(QuizStats.attempts), func.sum(QuizStats.total_correct)).one()
+    return (tuple(totals), db.session.query(func.max(Scores.id)).scalar())
+
+def cohort_report():
+    import reporting
+    version = cohort_version()
+    with cohort_lock:
+        cached = COHORT_REPORT.get("report")
+        if cached is None or cached[0] != version:
+            with db.engine.connect() as conn:
+                cached = (version, reporting.cohort_report(conn))
+            COHORT_REPORT["report"] = cached
+    return cached[1]
+
+@app.route('/admin/analytics')
+def admin_analytics():
+    if 'admin' not in session:
+        return redirect('/login')
+    return jsonify(cohort_report())
+
+@app.cli.command("cohort-report")
+def cohort_report_command():
+    print(json.dumps(cohort_report(), indent=2))
+
 @app.route('/admin/summary')
 def admin_summary():
     if 'admin' in session:
-        subjects = Subjects.query.all()
-        users = Users.query.all()
-        img_1 = os.path.join(curr_dir, "static", "imgs", "img_1.png")
-        quiz_count_dict = {}
-        for subject in subjects:
-            quiz_count_dict[subject.name] = 0
-            subject_chapters = Chapters.query.filter_by(subject_id=subject.id).all()
-            for chapter in subject_chapters:
-                quiz_count_dict[subject.name] += len(Quizzes.query.filter_by(chapter_id=chapter.id).all())
-        subject_names = [key for key in quiz_count_dict]
-        quiz_count = [value for value in quiz_count_dict]
-        plt.figure(figsize=(6,4))
-        sns.barplot(x= subject_names, y=quiz_count)
-        plt.title("Quiz per subject")
-        plt.xlabel("Subjects name")
-        plt.ylabel("No of quizzes")
-        plt.savefig(img_1, format="png")
-
-        img_2 = os.path.join(curr_dir, "static", "imgs", "img_2.png")
-        user_attempts_dict = {}
-        for user in users:
-            user_attempts_dict[user.name] = 0
-            scores = Scores.query.filter_by(user_id=user.id).all()
-            for score in scores:
-                user_attempts_dict[user.name] += 1
-        labels = user_attempts_dict.keys()
-        sizes = user_attempts_dict.values()
-        plt.figure(figsize=(6,4))
-        plt.pie(sizes, labels=labels, autopct='%1.1f%%', shadow=True, startangle=90)
-        plt.title("User attempts per subject")
-        plt.savefig(img_2, format="png")
+        data = summary_data()
+        img_1 = url_for('summary_chart', name="quizzes_per_subject", v=data_version(data["quizzes_per_subject"]))
+        img_2 = url_for('summary_chart', name="attempts_per_user", v=data_version(data["attempts_per_user"]))
         return render_template('admin_summary.html', img_1=img_1, img_2=img_2)
     return redirect('/login')
 
+@app.route('/admin/summary/<name>.png')
+def summary_chart(name):
+    if 'admin' not in session:
+        return redirect('/login')
+    data = summary_data()
+    if name not in data:
+        abort(404)
+    chart = cached_chart(name, data[name])
+    if chart is None:
+        return "Chart rendering is busy, try again shortly", 503, {"Retry-After": "2"}
+    version, png = chart
+    response = make_response(png)
+    response.headers["Content-Type"] = "image/png"
+    # The page links each chart with ?v=<data version>; that URL never changes content
+    if request.args.get("v") == version:
+        response.headers["Cache-Control"] = f"private, max-age={app.config['STATIC_MAX_AGE']}, immutable"
+    else:
+        response.headers["Cache-Control"] = "private, max-age=86400"
+    response.set_etag(version)
+    return response.make_conditional(request)
+
 
         
 @app.route('/quiz_chart')
@@ -631,25 +2594,133 @@ def quiz_chart():
 
 from flask import  jsonify  # Import your Scores model  # Import your database instance
 
+# Analytics for the signed-in student, aggregated in SQL and bounded in size: at most
+# ANALYTICS_MAX_QUIZZES quizzes (most recently attempted first) and ANALYTICS_TREND_BUCKETS
+# time buckets, however many attempts the user has. The ETag / Last-Modified come from the
+# user's rollup row, so a poll with nothing new is answered with 304 after one primary-key read.
+
+TREND_PERIODS = {
+    # period -> strftime format of its buckets
+    "day": "%Y-%m-%d",
+    "week": "%Y-W%W",
+    "month": "%Y-%m",
+}
+
+def trend_window(period):
+    # (start of the oldest, start of the current bucket) for the ANALYTICS_TREND_BUCKETS buckets
+    # in the trend. The window moves a whole bucket at a time, so between new scores the trend
+    # only changes when a bucket begins.
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    back = app.config["ANALYTICS_TREND_BUCKETS"] - 1
+    if period == "day":
+        return today - timedelta(days=back), today
+    if period == "week":
+        monday = today - timedelta(days=today.weekday())  # %W weeks start on Monday
+        return monday - timedelta(weeks=back), monday
+    month = today.year * 12 + today.month - 1 - back
+    return today.replace(year=month // 12, month=month % 12 + 1, day=1), today.replace(day=1)
+
+def quiz_analytics_statements(user_id, period):
+    quizzes = select(UserQuizStats, Quizzes.name) \
+        .join(Quizzes, Quizzes.id == UserQuizStats.quiz_id) \
+        .filter(UserQuizStats.user_id == user_id) \
+        .order_by(UserQuizStats.last_attempt.desc()) \
+        .limit(app.config["ANALYTICS_MAX_QUIZZES"])
+    bucket = func.strftime(TREND_PERIODS[period], Scores.timestamp)
+    trend = select(bucket, func.count(Scores.id), func.sum(Scores.score), func.sum(Scores.total_scored)) \
+        .filter(Scores.user_id == user_id, Scores.timestamp >= trend_window(period)[0]) \
+        .group_by(bucket).order_by(bucket.desc()).limit(app.config["ANALYTICS_TREND_BUCKETS"])
+    return quizzes, trend
+
+def quiz_analytics(user_id, period):
+    quizzes, trend = quiz_analytics_statements(user_id, period)
+    return analytics_payload(db.session.execute(quizzes).all(), db.session.execute(trend).all())
+
+def analytics_payload(rows, trend):
+    quizzes = [{
+        "quiz_id": stats.quiz_id,
+        "name": name,
+        "attempts": stats.attempts,
+        "best_score": stats.best_score,
+        "mean_score": round(stats.total_correct / stats.attempts, 2),
+        "last_score": stats.last_score,
+        "percentage": round(stats.total_correct * 100 / stats.total_possible, 1) if stats.total_possible else 0,
+        "last_attempt": stats.last_attempt.isoformat() if stats.last_attempt else None,
+    } for stats, name in rows]
+    return {
+        "quizzes": quizzes,
+        "trend": [{
+            "bucket": label,
+            "attempts": attempts,
+            "percentage": round(correct * 100 / possible, 1) if possible else 0,
+        } for label, attempts, correct, possible in reversed(trend)],
+    }
+
 @app.route('/quiz_scores')
 def quiz_scores():
-    # Fetch quiz scores grouped by quiz_id
-    scores_data = Scores.query.filter_by(user_id=session['user'])
-
-    # Convert the data to a dictionary for JSON response
-
-    scores_list = [{"quiz_id": row.quiz_id, "attempts": idx, "total_score": row.total_scored} for idx,row in enumerate(scores_data)]
-
-    return jsonify(scores_list)
-
-
-
-
-if __name__ == "__main__":
+    if 'user' not in session:
+        return jsonify({"error": "not logged in"}), 401
+    period = request.args.get('period', 'week')
+    if period not in TREND_PERIODS:
+        return jsonify({"error": f"period must be one of {', '.join(TREND_PERIODS)}"}), 400
+
+    stats = db.session.get(UserStats, session['user'])
+    etag, last_modified, not_modified = quiz_scores_validators(stats, period)
+    return quiz_scores_response(None if not_modified else quiz_analytics(session['user'], period), etag, last_modified)
+
+def quiz_scores_validators(stats, period):
+    # (etag, last modified, whether the request's validators still match). The current trend
+    # bucket is part of the version: a response stops matching once the window moves on.
+    current_bucket = trend_window(period)[1]
+    version = f"{stats.attempts}-{stats.total_correct}-{stats.total_possible}-{stats.last_attempt}" if stats else "none"
+    etag = hashlib.sha1(f"{version}-{period}-{current_bucket.isoformat()}".encode()).hexdigest()[:16]
+    last_modified = None
+    if stats and stats.last_attempt:
+        last_modified = max(stats.last_attempt, current_bucket).astimezone(timezone.utc).replace(microsecond=0)
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains_weak(etag)
+    else:
+        not_modified = bool(last_modified and request.if_modified_since and last_modified <= request.if_modified_since)
+    return etag, last_modified, not_modified
+
+def quiz_scores_response(payload, etag, last_modified):
+    # payload None answers 304
+    response = make_response("", 304) if payload is None else jsonify(payload)
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+
+
+# Application setup. `app` is a process-wide singleton, not built by a factory: the routes, hooks,
+# caches and background threads above are bound to it, and its engine, SQLite pragmas and
+# connection pool are built when this module is imported, from the QUIZMASTER_* environment
+# variables. setup_app() applies `config` to it, brings the schema up to date, creates the
+# admin account and returns it. The existing engine would silently ignore changes to
+# ENGINE_SETTINGS, so overriding them raises ValueError; set QUIZMASTER_DATABASE_URI /
+# QUIZMASTER_STORAGE_MODE / QUIZMASTER_POOL_SIZE before the import. asgi.py serves the same app.
+
+ENGINE_SETTINGS = ("SQLALCHEMY_DATABASE_URI", "SQLALCHEMY_BINDS", "SQLALCHEMY_ENGINE_OPTIONS", "SQLALCHEMY_ECHO",
+                   "STORAGE_MODE", "SQLITE_PRAGMAS")
+
+def setup_app(config=None):
+    config = dict(config or {})
+    fixed = [key for key in ENGINE_SETTINGS if key in config and config[key] != app.config.get(key)]
+    if fixed:
+        raise ValueError(f"{', '.join(fixed)} cannot be changed once app.py is imported; "
+                         "set the QUIZMASTER_* environment variables before importing it")
+    app.config.update(config)
     with app.app_context():
         db.create_all()
+        migrate_database()
         create_admin()
-    app.run(debug=True)
+    return app
+
+if __name__ == "__main__":
+    setup_app().run(debug=True)
 
 
 
@@ -0,0 +1,311 @@
+# Async serving mode. The high fan-in routes (submit_quiz, quiz_scores, autosave) run as coroutines
+# on an aiosqlite engine, so a request waiting on SQLite (a locked commit, a busy pool) holds no
+# thread and one process can keep thousands of connections open. Every other route runs the Flask
+# WSGI app on a pool of ASGI_WSGI_THREADS threads.
+#
+#   uvicorn --factory asgi:create_asgi_app --port 8000
+#
+# Needs aiosqlite and greenlet (for SQLAlchemy's asyncio extension) plus an ASGI server
+# such as uvicorn. The async views run inside a normal Flask request context, so sessions, flash
+# messages, templates and the before/after request hooks (metrics, compression) behave as in the
+# sync views; only their database access is awaited. Profiling (PROFILE_SAMPLE_RATE) also sees
+# whatever else the event loop runs meanwhile.
+import asyncio
+import io
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import flash, jsonify, redirect, render_template, request, session
+from sqlalchemy import event, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from werkzeug.exceptions import ClientDisconnected, HTTPException
+
+import app as quizmaster
+from app import (ANSWER_LAYOUTS, TREND_PERIODS, AnswerLayouts, UserStats, active_attempt_statement,
+                 analytics_payload, answer_key_statement, attempt_closed, autosave_answers,
+                 buffered_answers, cached_answer_key, discard_buffered_answers, enqueue_score,
+                 flush_autosaves, layout_question_ids, queue_answers, quiz_analytics_statements,
+                 quiz_cache_generation, quiz_scores_response, quiz_scores_validators,
+                 remember_answer_key, remember_layout_on_commit, score_insert, score_row)
+
+
+def async_database_uri(uri):
+    if not uri.startswith("sqlite://"):
+        raise ValueError(f"the async mode only supports SQLite databases, not {uri}")
+    return "sqlite+aiosqlite://" + uri[len("sqlite://"):]
+
+
+def create_async_database(app):
+    options = {key: value for key, value in app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {}).items()
+               if key in ("pool_size", "max_overflow", "pool_timeout", "connect_args")}
+    engine = create_async_engine(async_database_uri(app.config["SQLALCHEMY_DATABASE_URI"]), **options)
+
+    # app.apply_sqlite_pragmas only recognises sqlite3 connections, not aiosqlite's adapter
+    @event.listens_for(engine.sync_engine, "connect")
+    def apply_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in app.config["SQLITE_PRAGMAS"].items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
+
+    return engine, async_sessionmaker(engine, expire_on_commit=False)
+
+
+async def answer_key(db, quiz_id):
+    key = cached_answer_key(quiz_id)
+    if key is None:
+        generation = quiz_cache_generation()
+        key = remember_answer_key(quiz_id, (await db.execute(answer_key_statement(quiz_id))).all(), generation)
+    return key
+
+
+async def answer_layout(db, quiz_id, key):
+    question_ids = layout_question_ids(key)
+    layout_id = ANSWER_LAYOUTS.get((quiz_id, question_ids))
+    if layout_id is None:
+        await db.execute(sqlite_insert(AnswerLayouts).on_conflict_do_nothing(),
+                         {"quiz_id": quiz_id, "question_ids": question_ids})
+        layout_id = await db.scalar(select(AnswerLayouts.id).filter_by(quiz_id=quiz_id, question_ids=question_ids))
+        remember_layout_on_commit(db.sync_session, (quiz_id, question_ids), layout_id)
+    return layout_id
+
+
+def in_app_context(fn, *args):
+    with quizmaster.app.app_context():
+        return fn(*args)
+
+
+# The async views mirror submit_quiz, quiz_scores and autosave in app.py
+
+async def submit_quiz(sessions, quiz_id):
+    if 'user' not in session:
+        return redirect("/user")
+    user_id = session['user']
+    async with sessions() as db:
+        attempt = await db.scalar(active_attempt_statement(user_id, quiz_id))
+        if not attempt:
+            flash("This quiz was not started or has already been submitted.", "warning")
+            return redirect("/user")
+        answers = json.loads(attempt.answers)
+        answers.update(buffered_answers(user_id, quiz_id))
+        if attempt_closed(attempt):
+            flash("Time is up, only the answers saved before the deadline were graded.", "danger")
+        else:
+            answers.update(request.form.to_dict())
+        key = await answer_key(db, quiz_id)
+        new_score = score_row(user_id, quiz_id, attempt, key, answers, await answer_layout(db, quiz_id, key))
+        await db.delete(attempt)
+        if quizmaster.app.config["SCORE_WRITE_BEHIND"]:
+            await asyncio.to_thread(enqueue_score, new_score)
+        else:
+            await db.execute(score_insert(), [new_score])
+        await db.commit()
+    discard_buffered_answers(user_id, quiz_id)
+
+    return render_template('result.html', score=new_score["score"], total_score=new_score["total_scored"], quiz_id=quiz_id)
+
+
+async def quiz_scores(sessions):
+    if 'user' not in session:
+        return jsonify({"error": "not logged in"}), 401
+    period = request.args.get('period', 'week')
+    if period not in TREND_PERIODS:
+        return jsonify({"error": f"period must be one of {', '.join(TREND_PERIODS)}"}), 400
+
+    async with sessions() as db:
+        stats = await db.get(UserStats, session['user'])
+        etag, last_modified, not_modified = quiz_scores_validators(stats, period)
+        payload = None
+        if not not_modified:
+            quizzes, trend = quiz_analytics_statements(session['user'], period)
+            payload = analytics_payload((await db.execute(quizzes)).all(), (await db.execute(trend)).all())
+    return quiz_scores_response(payload, etag, last_modified)
+
+
+async def autosave(sessions, quiz_id):
+    if 'user' not in session:
+        return jsonify({"error": "not logged in"}), 401
+    user_id = session['user']
+    async with sessions() as db:
+        attempt = await db.scalar(active_attempt_statement(user_id, quiz_id))
+        if not attempt or attempt_closed(attempt):
+            return jsonify({"error": "no active attempt"}), 409
+        key = await answer_key(db, quiz_id)
+    answers = autosave_answers(request.get_json(silent=True), key)
+    if answers is None:
+        return jsonify({"error": "answers must map question ids of this quiz to options 1-4"}), 400
+    if queue_answers(user_id, quiz_id, answers):
+        await asyncio.to_thread(in_app_context, flush_autosaves)
+    return jsonify({"saved": len(answers)})
+
+
+# endpoint -> coroutine; the URL rules and methods are still the ones registered on the Flask app
+ASYNC_VIEWS = {"submit_quiz": submit_quiz, "quiz_scores": quiz_scores, "autosave": autosave}
+
+
+class ReceiveStream(io.RawIOBase):
+    # wsgi.input for the routes run on the thread pool: the body is pulled from `receive` as the
+    # view reads it, so a bulk import never holds the whole upload in memory
+    def __init__(self, receive, loop):
+        self.receive = receive
+        self.loop = loop
+        self.pending = memoryview(b"")
+        self.done = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self.pending and not self.done:
+            message = asyncio.run_coroutine_threadsafe(self.receive(), self.loop).result()
+            if message["type"] == "http.disconnect":
+                self.done = True
+                raise ClientDisconnected()
+            self.pending = memoryview(message.get("body", b""))
+            self.done = not message.get("more_body")
+        size = min(len(buffer), len(self.pending))
+        buffer[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        return size
+
+
+def wsgi_environ(scope, stream):
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode().decode("latin-1"),
+        "PATH_INFO": scope["path"].encode().decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "REMOTE_ADDR": scope["client"][0] if scope.get("client") else "",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": stream,
+        # the stream ends with the request body, whether or not it came with a Content-Length
+        "wsgi.input_terminated": True,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        name, value = name.decode("latin-1").upper().replace("-", "_"), value.decode("latin-1")
+        if name in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            environ[name] = value
+            continue
+        key = "HTTP_" + name
+        if key in environ:
+            value = environ[key] + ("; " if key == "HTTP_COOKIE" else ",") + value
+        environ[key] = value
+    return environ
+
+
+class QuizmasterASGI:
+    def __init__(self, app, engine, sessions):
+        self.app = app
+        self.engine = engine
+        self.sessions = sessions
+        self.pool = ThreadPoolExecutor(max_workers=app.config["ASGI_WSGI_THREADS"], thread_name_prefix="wsgi")
+        self.urls = app.url_map.bind("localhost")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self.lifespan(receive, send)
+        if scope["type"] != "http":
+            return
+        view, args = self.match(scope)
+        if view is None:
+            loop = asyncio.get_running_loop()
+            environ = wsgi_environ(scope, ReceiveStream(receive, loop))
+            return await loop.run_in_executor(self.pool, self.run_wsgi, environ, send, loop)
+        # the async views take small form posts, read in full before dispatch
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        environ = wsgi_environ(scope, io.BytesIO(body))
+        environ["CONTENT_LENGTH"] = str(len(body))
+        response = await self.dispatch(view, environ, args)
+        await send({"type": "http.response.start", "status": response.status_code,
+                    "headers": [(name.lower().encode("latin-1"), value.encode("latin-1"))
+                                for name, value in response.headers.items()]})
+        await send({"type": "http.response.body", "body": response.get_data()})
+
+    def run_wsgi(self, environ, send, loop):
+        # Runs on a pool thread; each message is handed to the event loop and waited for, so a
+        # slow client holds back the thread that produces its response
+        def emit(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        start = []
+
+        def start_response(status, headers, exc_info=None):
+            start[:] = [int(status.split(" ", 1)[0]),
+                        [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers]]
+
+        chunks = self.app(environ, start_response)
+        try:
+            started = False
+            for chunk in chunks:
+                if not chunk:
+                    continue
+                if not started:
+                    emit({"type": "http.response.start", "status": start[0], "headers": start[1]})
+                    started = True
+                emit({"type": "http.response.body", "body": chunk, "more_body": True})
+            if not started:
+                emit({"type": "http.response.start", "status": start[0], "headers": start[1]})
+            emit({"type": "http.response.body", "body": b""})
+        finally:
+            if hasattr(chunks, "close"):
+                chunks.close()
+
+    def match(self, scope):
+        try:
+            endpoint, args = self.urls.match(scope["path"], scope["method"])
+        except HTTPException:  # 404, 405 and slash redirects are left to Flask
+            return None, None
+        return ASYNC_VIEWS.get(endpoint), args
+
+    async def dispatch(self, view, environ, args):
+        # What Flask's wsgi_app / full_dispatch_request do, with the view awaited
+        app = self.app
+        with app.request_context(environ):
+            try:
+                try:
+                    rv = app.preprocess_request()
+                    if rv is None:
+                        rv = await view(self.sessions, **args)
+                except Exception as e:
+                    rv = app.handle_user_exception(e)
+                return app.finalize_request(rv)
+            except Exception as e:
+                return app.make_response(app.handle_exception(e))
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.engine.dispose()
+                self.pool.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+def create_asgi_app(config=None):
+    # Builds the ASGI wrapper and its aiosqlite engine around the singleton app.app, set up by
+    # app.setup_app(), so `config` has the same limits: the database and storage mode come from
+    # the QUIZMASTER_* environment. Call it once per process.
+    app = quizmaster.setup_app(config)
+    engine, sessions = create_async_database(app)
+    return QuizmasterASGI(app, engine, sessions)
@@ -0,0 +1,108 @@
+# Cohort analytics benchmark: bulk-loads a large scores table (10M rows by default), then times
+# reporting.cohort_report() against the same statistics computed by looping over ORM objects.
+# The ORM loop is only run up to --orm-limit rows and extrapolated beyond that.
+#
+#   python benchmarks/analytics.py --scores 10000000 --users 200000
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def fill_scores(m, db, count, users, quizzes, questions, seed_value=0):
+    # The rollup insert trigger is dropped for the load; the rollup tables are left stale,
+    # since nothing here reads them
+    rng = np.random.default_rng(seed_value)
+    first_user = db.session.query(db.func.min(m.Users.id)).filter(m.Users.is_admin.is_(False)).scalar()
+    start = time.time() - 365 * 86400
+    with db.engine.begin() as conn:
+        conn.exec_driver_sql("DROP TRIGGER IF EXISTS stats_scores_insert")
+        cursor = conn.connection.driver_connection.cursor()
+        for offset in range(0, count, 1000000):
+            size = min(1000000, count - offset)
+            stamps = np.datetime_as_string((start + rng.integers(0, 365 * 86400, size)).astype("datetime64[s]"), unit="us")
+            rows = zip(rng.integers(0, questions + 1, size).tolist(),
+                       (first_user + rng.integers(0, users, size)).tolist(),
+                       rng.integers(1, quizzes + 1, size).tolist(),
+                       np.char.replace(stamps, "T", " ").tolist())
+            cursor.executemany("INSERT INTO scores (score, user_id, quiz_id, timestamp, total_scored) "
+                               f"VALUES (?, ?, ?, ?, {questions})", rows)
+        m.create_stats_triggers(conn)
+
+
+def orm_report(m, limit, top=20):
+    # The pre-NumPy way: walk Scores objects and accumulate in dicts
+    quizzes, subjects, users = {}, {}, {}
+    for score in m.Scores.query.options(m.joinedload(m.Scores.quiz).joinedload(m.Quizzes.chapter)).limit(limit):
+        ratio = score.score / score.total_scored if score.total_scored else 0
+        quiz = quizzes.setdefault(score.quiz_id, [0, 0, 0])
+        quiz[0] += 1
+        quiz[1] += score.score
+        quiz[2] += score.total_scored
+        subjects.setdefault(score.quiz.chapter.subject_id, []).append(ratio * 100)
+        user = users.setdefault(score.user_id, [0, 0, 0])
+        user[0] += 1
+        user[1] += score.score
+        user[2] += score.total_scored
+    hardest = sorted(quizzes, key=lambda q: quizzes[q][1] / quizzes[q][2] if quizzes[q][2] else 1)[:top]
+    report = {}
+    for subject, values in subjects.items():
+        values.sort()
+        report[subject] = [values[min(int(len(values) * p / 100), len(values) - 1)] for p in (10, 25, 50, 75, 90)]
+    ranking = sorted(users, key=lambda u: (-users[u][1], -(users[u][1] / users[u][2] if users[u][2] else 0)))[:top]
+    return hardest, report, ranking
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scores", type=int, default=10000000)
+    parser.add_argument("--users", type=int, default=200000)
+    parser.add_argument("--orm-limit", type=int, default=200000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="quizmaster-analytics-")
+    os.environ["QUIZMASTER_DATABASE_URI"] = "sqlite:///" + os.path.join(workdir, "analytics.sqlite3")
+    sys.path.insert(0, os.path.dirname(ROOT))
+    sys.path.insert(0, ROOT)
+    import app as quizmaster
+    import reporting
+    from seed import seed
+
+    m, db = quizmaster, quizmaster.db
+    report = {"scores": args.scores, "users": args.users}
+    with m.app.app_context():
+        db.create_all()
+        m.migrate_database()
+        start = time.perf_counter()
+        counts = seed(m, subjects=10, chapters=10, quizzes=10, questions=10, users=args.users, attempts=0)
+        fill_scores(m, db, args.scores, args.users, counts["quizzes"], 10)
+        report["seed_seconds"] = round(time.perf_counter() - start, 1)
+
+        with db.engine.connect() as conn:
+            start = time.perf_counter()
+            scores = reporting.load_scores(conn)
+            report["numpy_load_seconds"] = round(time.perf_counter() - start, 2)
+            start = time.perf_counter()
+            reporting.cohort_report(conn)
+            report["numpy_report_seconds"] = round(time.perf_counter() - start, 2)
+            del scores
+
+        rows = min(args.orm_limit, args.scores)
+        start = time.perf_counter()
+        orm_report(m, rows)
+        elapsed = time.perf_counter() - start
+        db.session.expunge_all()
+        report["orm_rows"] = rows
+        report["orm_seconds"] = round(elapsed, 2)
+        report["orm_seconds_extrapolated"] = round(elapsed * args.scores / rows, 1)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+# Sync WSGI vs async ASGI serving: the same database is served by the threaded Werkzeug server
+# (what `python app.py` runs) and by uvicorn with asgi.create_asgi_app, and the same number of
+# simulated students hold one keep-alive connection each and loop over the exam-time requests:
+# /start_quiz, three /autosave posts, a /quiz_scores poll and /submit_quiz. Reports throughput,
+# latency percentiles per route, failures and the server's memory and thread count.
+#
+#   python benchmarks/async_serving.py --connections 100,1000 --seconds 20
+#
+# Client and server share the machine, so on few cores the absolute numbers are client-bound;
+# compare how each mode holds up as --connections grows.
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+HOST = "127.0.0.1"
+SERVERS = {
+    "wsgi": "from werkzeug.serving import run_simple; import app; "
+            "run_simple({host!r}, {port}, app.setup_app(), threaded=True)",
+    "asgi": "import uvicorn; uvicorn.run('asgi:create_asgi_app', factory=True, host={host!r}, port={port}, "
+            "log_level='warning', backlog=4096)",
+}
+
+
+class Client:
+    # One student on one keep-alive HTTP/1.1 connection
+    def __init__(self, port, cookie):
+        self.port = port
+        self.cookie = cookie
+        self.stream = None
+
+    async def request(self, method, path, body=None, content_type=None):
+        if self.stream is None:
+            self.stream = await asyncio.open_connection(HOST, self.port)
+        reader, writer = self.stream
+        head = f"{method} {path} HTTP/1.1\r\nHost: {HOST}\r\nCookie: {self.cookie}\r\n"
+        if body is not None:
+            head += f"Content-Type: {content_type}\r\nContent-Length: {len(body)}\r\n"
+        writer.write(head.encode() + b"\r\n" + (body or b""))
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if "content-length" in headers:
+            await reader.readexactly(int(headers["content-length"]))
+        elif headers.get("transfer-encoding") == "chunked":
+            while True:
+                size = int((await reader.readline()).strip(), 16)
+                await reader.readexactly(size + 2)
+                if not size:
+                    break
+        elif status not in (204, 304):
+            await reader.read()
+            headers["connection"] = "close"
+        if headers.get("connection", "").lower() == "close":
+            self.close()
+        return status
+
+    def close(self):
+        if self.stream is not None:
+            self.stream[1].close()
+            self.stream = None
+
+
+async def student(port, cookie, quiz_id, question_ids, deadline, timings, failures):
+    client = Client(port, cookie)
+    steps = [("GET", f"/start_quiz/{quiz_id}", "/start_quiz/<id>", None, None, 302)]
+    steps += [("POST", f"/autosave/{quiz_id}", "/autosave/<id>", None, "application/json", 200)] * 3
+    steps += [("GET", "/quiz_scores?period=week", "/quiz_scores", None, None, 200),
+              ("POST", f"/submit_quiz/{quiz_id}", "/submit_quiz/<id>", None, "application/x-www-form-urlencoded", 200)]
+    await asyncio.sleep(random.random())  # spread the first requests out
+    while time.perf_counter() < deadline:
+        for method, path, route, body, content_type, expected in steps:
+            if route == "/autosave/<id>":
+                body = json.dumps({"answers": {random.choice(question_ids): str(random.randint(1, 4))}}).encode()
+            elif route == "/submit_quiz/<id>":
+                body = "&".join(f"{q}={random.randint(1, 4)}" for q in question_ids).encode()
+            start = time.perf_counter()
+            try:
+                status = await asyncio.wait_for(client.request(method, path, body, content_type), 60)
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError, IndexError):
+                client.close()
+                status = None
+            timings.setdefault(route, []).append((time.perf_counter() - start) * 1000)
+            if status != expected:
+                failures[route] = failures.get(route, 0) + 1
+    client.close()
+
+
+def percentile(ordered, p):
+    return ordered[max(int(round(p / 100 * len(ordered))) - 1, 0)]
+
+
+def server_usage(pid):
+    usage = {}
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith(("VmHWM:", "Threads:")):
+                name, value = line.split(":")
+                usage[name] = int(value.split()[0])
+    return {"peak_rss_mb": round(usage["VmHWM"] / 1024, 1), "threads": usage["Threads"]}
+
+
+async def drive(port, cookies, quizzes, seconds, server):
+    deadline = time.perf_counter() + seconds
+    timings, failures = {}, {}
+    tasks = [student(port, cookie, *quizzes[i % len(quizzes)], deadline, timings, failures)
+             for i, cookie in enumerate(cookies)]
+    # sample the server mid-run, while every connection is open
+    sampler = asyncio.get_running_loop().run_in_executor(None, lambda: (time.sleep(seconds * 0.8), server_usage(server.pid))[1])
+    await asyncio.gather(*tasks)
+    usage = await sampler
+    routes = {}
+    for route, samples in timings.items():
+        samples.sort()
+        routes[route] = {
+            "requests": len(samples),
+            "failed": failures.get(route, 0),
+            "p50_ms": round(percentile(samples, 50), 1),
+            "p95_ms": round(percentile(samples, 95), 1),
+            "p99_ms": round(percentile(samples, 99), 1),
+        }
+    total = sum(len(samples) for samples in timings.values())
+    return dict(requests_per_sec=round(total / seconds, 1), failed=sum(failures.values()), server=usage, routes=routes)
+
+
+def wait_for_port(port, timeout=30):
+    import socket
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection((HOST, port), 1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"server on port {port} did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--connections", default="100,1000")
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--modes", default="wsgi,asgi")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--out")
+    args = parser.parse_args()
+    levels = [int(level) for level in args.connections.split(",")]
+
+    workdir = tempfile.mkdtemp(prefix="quizmaster-async-")
+    os.environ["QUIZMASTER_DATABASE_URI"] = "sqlite:///" + os.path.join(workdir, "async.sqlite3")
+    os.environ["QUIZMASTER_SCORE_QUEUE_PATH"] = os.path.join(workdir, "queue.sqlite3")
+    os.environ.setdefault("QUIZMASTER_STORAGE_MODE", "production")
+    sys.path.insert(0, os.path.dirname(ROOT))
+    sys.path.insert(0, ROOT)
+    import app as quizmaster
+    from seed import seed
+
+    app = quizmaster.setup_app()
+    with app.app_context():
+        seed(quizmaster, subjects=2, chapters=2, quizzes=5, questions=10, users=max(levels), attempts=2)
+        first_user = quizmaster.db.session.query(quizmaster.db.func.min(quizmaster.Users.id)) \
+            .filter(quizmaster.Users.is_admin.is_(False)).scalar()
+        quizzes = [(quiz.id, [str(question.id) for question in quiz.questions]) for quiz in quizmaster.Quizzes.query]
+    # signed session cookies, so thousands of students need no scrypt logins first
+    serializer = app.session_interface.get_signing_serializer(app)
+    cookie_name = app.config["SESSION_COOKIE_NAME"]
+    cookies = [f"{cookie_name}={serializer.dumps({'user': first_user + i})}" for i in range(max(levels))]
+
+    report = {"cpus": os.cpu_count(), "seconds": args.seconds, "storage_mode": os.environ["QUIZMASTER_STORAGE_MODE"], "runs": []}
+    for mode in args.modes.split(","):
+        for level in levels:
+            code = SERVERS[mode].format(host=HOST, port=args.port)
+            log_path = os.path.join(workdir, f"{mode}-{level}.log")
+            with open(log_path, "w") as log:
+                server = subprocess.Popen([sys.executable, "-c", code], cwd=os.path.dirname(ROOT),
+                                          stdout=log, stderr=subprocess.STDOUT)
+                try:
+                    wait_for_port(args.port)
+                    result = asyncio.run(drive(args.port, cookies[:level], quizzes, args.seconds, server))
+                finally:
+                    server.terminate()
+                    server.wait()
+            result["server"]["log"] = log_path
+            report["runs"].append(dict(mode=mode, connections=level, **result))
+            print(f"{mode} {level} connections: {result['requests_per_sec']} req/s, {result['failed']} failed", file=sys.stderr)
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as out:
+            out.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# Bulk question import/export benchmark.
+# Generates a CSV question bank on disk, imports it through /import_questions and streams it back
+# out of /export_questions, reporting rows/sec and how much the process peak RSS grew per phase.
+#
+#   python benchmarks/bulk_io.py --rows 100000
+import argparse
+import csv
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def write_bank(path, rows):
+    fields = ["subject", "chapter", "quiz", "date_of_quiz", "time_duration", "remarks",
+              "question_text", "option_1", "option_2", "option_3", "option_4", "correct_answer"]
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(fields)
+        for i in range(rows):
+            quiz = i // 50
+            writer.writerow([f"Subject {quiz // 100}", f"Chapter {quiz // 10}", f"Quiz {quiz}",
+                             "2030-01-01", 30, "", f"Question {i}?", "A", "B", "C", "D", i % 4 + 1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="quizmaster-bench-")
+    os.environ["QUIZMASTER_DATABASE_URI"] = "sqlite:///" + os.path.join(workdir, "bench.sqlite3")
+    sys.path.insert(0, ROOT)
+    import app as quizmaster
+
+    with quizmaster.app.app_context():
+        quizmaster.db.create_all()
+        quizmaster.create_admin()
+    client = quizmaster.app.test_client()
+    client.post("/login", data={"email": "admin@gmail.com", "password": "0000"})
+
+    bank = os.path.join(workdir, "bank.csv")
+    write_bank(bank, args.rows)
+    report = {"rows": args.rows, "file_mb": os.path.getsize(bank) / 2**20, "baseline_rss_mb": peak_rss_mb()}
+
+    start = time.perf_counter()
+    with open(bank, "rb") as f:
+        client.post("/import_questions", data={"file": (f, "bank.csv")}, content_type="multipart/form-data")
+    elapsed = time.perf_counter() - start
+    with quizmaster.app.app_context():
+        imported = quizmaster.Questions.query.count()
+    report["import"] = {"seconds": elapsed, "rows_per_sec": imported / elapsed, "imported": imported,
+                        "peak_rss_growth_mb": peak_rss_mb() - report["baseline_rss_mb"]}
+
+    before = peak_rss_mb()
+    start = time.perf_counter()
+    response = client.get("/export_questions")
+    size = sum(len(chunk) for chunk in response.response)
+    elapsed = time.perf_counter() - start
+    report["export"] = {"seconds": elapsed, "rows_per_sec": imported / elapsed, "mb": size / 2**20,
+                        "peak_rss_growth_mb": peak_rss_mb() - before}
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# Concurrent submit load test: several worker processes submit quizzes against one SQLite file
+# while others keep reading history pages, once per storage mode, and report sustained
+# submissions/sec and how many requests failed (e.g. "database is locked").
+#
+#   python benchmarks/concurrent_submit.py --writers 8 --readers 4 --seconds 10
+#
+# A mode may carry a "+write-behind" suffix (e.g. production+write-behind) to queue scores.
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_app(db_path, mode):
+    os.environ["QUIZMASTER_DATABASE_URI"] = "sqlite:///" + db_path
+    os.environ["QUIZMASTER_SCORE_QUEUE_PATH"] = db_path + ".queue"
+    storage, _, extra = mode.partition("+")
+    os.environ["QUIZMASTER_STORAGE_MODE"] = storage
+    os.environ["QUIZMASTER_SCORE_WRITE_BEHIND"] = "1" if extra == "write-behind" else "0"
+    sys.path.insert(0, os.path.dirname(ROOT))
+    sys.path.insert(0, ROOT)
+    import app as quizmaster
+    quizmaster.app.logger.disabled = True
+    return quizmaster
+
+
+def prepare(db_path, mode, students):
+    quizmaster = load_app(db_path, mode)
+    from seed import seed
+    with quizmaster.app.app_context():
+        quizmaster.db.create_all()
+        quizmaster.migrate_database()
+        seed(quizmaster, users=students, attempts=20)
+
+
+def worker(db_path, mode, student, role, seconds, results):
+    quizmaster = load_app(db_path, mode)
+    client = quizmaster.app.test_client()
+    client.post("/login", data={"email": f"student{student}@example.com", "password": "password"})
+    with quizmaster.app.app_context():
+        quiz_ids = [quiz.id for quiz in quizmaster.Quizzes.query.limit(10)]
+        answers = {quiz_id: {str(question.id): "1" for question in
+                             quizmaster.Questions.query.filter_by(quiz_id=quiz_id)} for quiz_id in quiz_ids}
+    done = failed = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        quiz_id = quiz_ids[done % len(quiz_ids)]
+        if role == "writer":
+            client.get(f"/start_quiz/{quiz_id}")
+            response = client.post(f"/submit_quiz/{quiz_id}", data=answers[quiz_id])
+        else:
+            response = client.get("/user/history")
+        if response.status_code == 200:
+            done += 1
+        else:
+            failed += 1
+    results.put((role, done, failed))
+
+
+def run(mode, writers, readers, seconds):
+    ctx = multiprocessing.get_context("spawn")
+    db_path = os.path.join(tempfile.mkdtemp(prefix="quizmaster-load-"), "load.sqlite3")
+    setup = ctx.Process(target=prepare, args=(db_path, mode, writers + readers))
+    setup.start()
+    setup.join()
+
+    results = ctx.Queue()
+    roles = ["writer"] * writers + ["reader"] * readers
+    processes = [ctx.Process(target=worker, args=(db_path, mode, i + 1, role, seconds, results))
+                 for i, role in enumerate(roles)]
+    for process in processes:
+        process.start()
+    totals = {"writer": [0, 0], "reader": [0, 0]}
+    for _ in processes:
+        role, done, failed = results.get()
+        totals[role][0] += done
+        totals[role][1] += failed
+    for process in processes:
+        process.join()
+    return {
+        "submissions_per_sec": totals["writer"][0] / seconds,
+        "failed_submissions": totals["writer"][1],
+        "history_reads_per_sec": totals["reader"][0] / seconds,
+        "failed_reads": totals["reader"][1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--modes", default="default,production,production+write-behind")
+    args = parser.parse_args()
+    report = {mode: run(mode, args.writers, args.readers, args.seconds) for mode in args.modes.split(",")}
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
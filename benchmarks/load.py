@@ -0,0 +1,269 @@
+# End-to-end load test: worker processes replay the student path (/login -> /start_quiz ->
+# /quiz -> /submit_quiz -> /user/history) and the admin path (/admin, /admin/summary,
+# /admin/search) for a fixed time, then report throughput and p50/p95/p99 latency per route.
+#
+#   python benchmarks/load.py --students 8 --admins 1 --seconds 30 --out results/HEAD.json
+#   python benchmarks/load.py --db /tmp/load.sqlite3 --url http://127.0.0.1:5000 --baseline results/main.json
+#
+# Without --db a database is seeded into a temporary directory at the --subjects/--users/...
+# scale (benchmarks/seed.py builds one ahead of time). Without --url every worker serves the
+# app in-process through the Flask test client; with --url it talks HTTP to a running server,
+# which must use the same --db file, since quiz and question ids are read from it.
+# --baseline adds each route's p95 change against an earlier report.
+import argparse
+import http.cookiejar
+import json
+import multiprocessing
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+SEARCH_TERMS = ("algebra", "kernel", "photon", "Subject 1", "student1")
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpClient:
+    # Cookie-keeping HTTP session that, like the test client, does not follow redirects
+    def __init__(self, url):
+        self.url = url.rstrip("/")
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), NoRedirect())
+
+    def request(self, method, path, data=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        try:
+            with self.opener.open(urllib.request.Request(self.url + path, data=body, method=method)) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as error:
+            error.read()
+            return error.code
+
+
+class TestClient:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None):
+        return self.client.open(path, method=method, data=data).status_code
+
+
+def load_app(db_path, mode):
+    os.environ["QUIZMASTER_DATABASE_URI"] = "sqlite:///" + db_path
+    os.environ["QUIZMASTER_SCORE_QUEUE_PATH"] = db_path + ".queue"
+    os.environ["QUIZMASTER_STORAGE_MODE"] = mode
+    sys.path.insert(0, os.path.dirname(ROOT))
+    sys.path.insert(0, ROOT)
+    import app as quizmaster
+    quizmaster.app.logger.disabled = True
+    return quizmaster
+
+
+def prepare(db_path, counts):
+    from seed import create_database
+    create_database(db_path, **counts)
+
+
+def quiz_answers(quizmaster, limit=50):
+    # {quiz id: submit form} for quizzes that can be started today, every answer "1"
+    with quizmaster.app.app_context():
+        m = quizmaster
+        quizzes = m.Quizzes.query.filter(m.Quizzes.date_of_quiz > datetime.now().date()).order_by(m.Quizzes.id).limit(limit)
+        answers = {}
+        for quiz in quizzes:
+            form = {str(question.id): "1" for question in m.Questions.query.filter_by(quiz_id=quiz.id)}
+            if form:
+                answers[quiz.id] = form
+        students = m.Users.query.filter(m.Users.is_admin.is_(False)).order_by(m.Users.id).all()
+        return answers, [student.email for student in students]
+
+
+def student_journey(client, email, quiz_id, form, timings):
+    steps = [("POST", "/login", "/login", {"email": email, "password": "password"}),
+             ("GET", f"/start_quiz/{quiz_id}", "/start_quiz/<id>", None),
+             ("GET", f"/quiz/{quiz_id}", "/quiz/<id>", None),
+             ("POST", f"/submit_quiz/{quiz_id}", "/submit_quiz/<id>", form),
+             ("GET", "/user/history", "/user/history", None)]
+    run_steps(client, steps, timings)
+
+
+def admin_journey(client, term, timings):
+    steps = [("GET", "/admin", "/admin", None),
+             ("GET", "/admin/summary", "/admin/summary", None),
+             ("GET", "/admin/search?" + urllib.parse.urlencode({"query": term}), "/admin/search", None)]
+    run_steps(client, steps, timings)
+
+
+def run_steps(client, steps, timings):
+    for method, path, route, data in steps:
+        start = time.perf_counter()
+        status = client.request(method, path, data)
+        elapsed = (time.perf_counter() - start) * 1000
+        samples, errors = timings.setdefault(route, ([], [0]))
+        samples.append(elapsed)
+        if status >= 400:
+            errors[0] += 1
+
+
+def worker(db_path, mode, url, role, index, workers, seconds, start_event, results):
+    quizmaster = load_app(db_path, mode)
+    answers, emails = quiz_answers(quizmaster)
+    quiz_ids = sorted(answers)
+    # each student process owns every workers-th account so no two processes share a user
+    mine = emails[index::workers] if role == "student" else []
+
+    def new_client():
+        return HttpClient(url) if url else TestClient(quizmaster.app)
+
+    def journey(n, timings):
+        client = new_client()
+        if role == "student":
+            quiz_id = quiz_ids[(index + n) % len(quiz_ids)]
+            student_journey(client, mine[n % len(mine)], quiz_id, answers[quiz_id], timings)
+        else:
+            client.request("POST", "/login", {"email": "admin@gmail.com", "password": "0000"})
+            admin_journey(client, SEARCH_TERMS[n % len(SEARCH_TERMS)], timings)
+
+    journey(0, {})  # warm-up, not recorded
+    start_event.wait()
+    timings, n = {}, 1
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        journey(n, timings)
+        n += 1
+    results.put((role, n - 1, {route: (samples, errors[0]) for route, (samples, errors) in timings.items()}))
+
+
+def percentile(ordered, p):
+    # nearest-rank on an already sorted list
+    return ordered[max(int(round(p / 100 * len(ordered))) - 1, 0)]
+
+
+def summarize(samples, errors, seconds):
+    ordered = sorted(samples)
+    return {
+        "requests": len(ordered),
+        "errors": errors,
+        "requests_per_sec": round(len(ordered) / seconds, 2),
+        "mean_ms": round(sum(ordered) / len(ordered), 2),
+        "p50_ms": round(percentile(ordered, 50), 2),
+        "p95_ms": round(percentile(ordered, 95), 2),
+        "p99_ms": round(percentile(ordered, 99), 2),
+        "max_ms": round(ordered[-1], 2),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, check=True,
+                              capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    ctx = multiprocessing.get_context("spawn")
+    db_path = os.path.abspath(args.db) if args.db else \
+        os.path.join(tempfile.mkdtemp(prefix="quizmaster-load-"), "load.sqlite3")
+    if not args.db:
+        counts = {name: getattr(args, name) for name in ("subjects", "chapters", "quizzes", "questions", "users", "attempts")}
+        setup = ctx.Process(target=prepare, args=(db_path, counts))
+        setup.start()
+        setup.join()
+        if setup.exitcode:
+            sys.exit("seeding failed")
+    with sqlite3.connect(db_path) as conn:
+        if conn.execute("SELECT count(*) FROM users WHERE is_admin = 0").fetchone()[0] < args.students:
+            sys.exit("the database needs at least one student account per student worker")
+
+    start_event, results = ctx.Event(), ctx.Queue()
+    roles = [("student", i, args.students) for i in range(args.students)] + \
+            [("admin", i, args.admins) for i in range(args.admins)]
+    processes = [ctx.Process(target=worker, args=(db_path, args.mode, args.url, role, index, workers,
+                                                  args.seconds, start_event, results))
+                 for role, index, workers in roles]
+    for process in processes:
+        process.start()
+    # workers block on the event after their warm-up journey; the queue is only read afterwards
+    time.sleep(args.warmup)
+    start_event.set()
+    journeys, routes = {"student": 0, "admin": 0}, {}
+    for _ in processes:
+        role, count, timings = results.get()
+        journeys[role] += count
+        for route, (samples, errors) in timings.items():
+            merged = routes.setdefault(route, ([], [0]))
+            merged[0].extend(samples)
+            merged[1][0] += errors
+    for process in processes:
+        process.join()
+
+    return {
+        "commit": git_commit(),
+        "started": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "target": args.url or "test-client",
+        "mode": args.mode,
+        "students": args.students,
+        "admins": args.admins,
+        "seconds": args.seconds,
+        "student_journeys_per_sec": round(journeys["student"] / args.seconds, 2),
+        "admin_journeys_per_sec": round(journeys["admin"] / args.seconds, 2),
+        "routes": {route: summarize(samples, errors[0], args.seconds) for route, (samples, errors) in routes.items()},
+    }
+
+
+def compare(report, baseline):
+    # p95 of each route relative to the baseline run, e.g. 1.25 = 25% slower
+    for route, stats in report["routes"].items():
+        before = baseline.get("routes", {}).get(route)
+        if before and before["p95_ms"]:
+            stats["p95_vs_baseline"] = round(stats["p95_ms"] / before["p95_ms"], 2)
+    report["baseline_commit"] = baseline.get("commit")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, default=4)
+    parser.add_argument("--admins", type=int, default=1)
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--warmup", type=float, default=2)
+    parser.add_argument("--mode", default="production", help="QUIZMASTER_STORAGE_MODE for in-process workers")
+    parser.add_argument("--url", help="base URL of a running server instead of the in-process test client")
+    parser.add_argument("--db", help="seeded database file; a temporary one is seeded when omitted")
+    parser.add_argument("--out", help="write the JSON report here as well as to stdout")
+    parser.add_argument("--baseline", help="earlier JSON report to compare p95 latencies against")
+    for name, default in (("subjects", 3), ("chapters", 3), ("quizzes", 3), ("questions", 10),
+                          ("users", 200), ("attempts", 20)):
+        parser.add_argument(f"--{name}", type=int, default=default)
+    args = parser.parse_args()
+    if args.students < 1 and args.admins < 1:
+        parser.error("need at least one student or admin worker")
+
+    report = run(args)
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            compare(report, json.load(baseline))
+    output = json.dumps(report, indent=2)
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w") as out:
+            out.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# Login throughput: for each password hash method, client threads sign in as seeded students for
+# a fixed time and the report gives logins/sec, latency percentiles and the cost of one hash.
+# One more thread keeps loading the login page meanwhile, to show how much other requests slow down.
+# Each method runs in its own process with a fresh database.
+#
+#   python benchmarks/logins.py --methods scrypt:32768:8:1,scrypt:16384:8:1 --clients 16 --workers 4
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def run(method, clients, workers, seconds):
+    workdir = tempfile.mkdtemp(prefix="quizmaster-logins-")
+    os.environ["QUIZMASTER_DATABASE_URI"] = "sqlite:///" + os.path.join(workdir, "logins.sqlite3")
+    os.environ["QUIZMASTER_PASSWORD_HASH"] = method
+    os.environ["QUIZMASTER_PASSWORD_HASH_WORKERS"] = str(workers)
+    sys.path.insert(0, os.path.dirname(ROOT))
+    sys.path.insert(0, ROOT)
+    import app as quizmaster
+    from seed import seed
+
+    quizmaster.app.logger.disabled = True
+    with quizmaster.app.app_context():
+        quizmaster.db.create_all()
+        quizmaster.migrate_database()
+        seed(quizmaster, users=clients, attempts=0)
+    start = time.perf_counter()
+    quizmaster.hash_password("password")
+    hash_ms = (time.perf_counter() - start) * 1000
+
+    latencies, statuses = [], {}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def sign_in(student):
+        client = quizmaster.app.test_client()
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            status = client.post("/login", data={"email": f"student{student}@example.com", "password": "password"}).status_code
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                latencies.append(elapsed)
+                statuses[status] = statuses.get(status, 0) + 1
+
+    page_latencies = []
+
+    def browse():
+        client = quizmaster.app.test_client()
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            client.get("/login")
+            page_latencies.append((time.perf_counter() - start) * 1000)
+            time.sleep(0.01)
+
+    threads = [threading.Thread(target=sign_in, args=(i + 1,)) for i in range(clients)]
+    threads.append(threading.Thread(target=browse))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    latencies.sort()
+    page_latencies.sort()
+    return {
+        "method": method,
+        "hash_ms": round(hash_ms, 1),
+        "logins_per_sec": round(statuses.get(302, 0) / seconds, 2),
+        "statuses": statuses,
+        "p50_ms": round(latencies[len(latencies) // 2], 1),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95)], 1),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99)], 1),
+        "page_p50_ms": round(page_latencies[len(page_latencies) // 2], 1),
+        "page_p95_ms": round(page_latencies[int(len(page_latencies) * 0.95)], 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--methods", default="scrypt:32768:8:1,scrypt:16384:8:1,pbkdf2:sha256:600000")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--method", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.method:
+        print(json.dumps(run(args.method, args.clients, args.workers, args.seconds)))
+        return
+    report = {"clients": args.clients, "workers": args.workers, "cpus": os.cpu_count(), "methods": []}
+    for method in args.methods.split(","):
+        output = subprocess.run([sys.executable, __file__, "--method", method, "--clients", str(args.clients),
+                                 "--workers", str(args.workers), "--seconds", str(args.seconds)],
+                                check=True, capture_output=True, text=True).stdout
+        report["methods"].append(json.loads(output.strip().splitlines()[-1]))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
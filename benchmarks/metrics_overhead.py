@@ -0,0 +1,81 @@
+# Instrumentation overhead: times a few routes with the /metrics hooks in place and again
+# with every instrumentation hook and listener detached, and reports the per-request cost.
+#
+#   python benchmarks/metrics_overhead.py --requests 2000
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+from flask import before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+PATHS = ["/user", "/quiz/1", "/user/history", "/quiz_scores"]
+
+
+def per_request_ms(client, count):
+    start = time.perf_counter()
+    for i in range(count):
+        client.get(PATHS[i % len(PATHS)])
+    return (time.perf_counter() - start) * 1000 / count
+
+
+def detach(m):
+    app = m.app
+    app.before_request_funcs[None].remove(m.start_request_metrics)
+    app.after_request_funcs[None].remove(m.record_request_metrics)
+    event.remove(Engine, "before_cursor_execute", m.start_sql_timer)
+    event.remove(Engine, "after_cursor_execute", m.stop_sql_timer)
+    before_render_template.disconnect(m.start_template_timer, app)
+    template_rendered.disconnect(m.stop_template_timer, app)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="quizmaster-metrics-")
+    os.environ["QUIZMASTER_DATABASE_URI"] = "sqlite:///" + os.path.join(workdir, "metrics.sqlite3")
+    sys.path.insert(0, os.path.dirname(ROOT))
+    sys.path.insert(0, ROOT)
+    import app as quizmaster
+    from seed import seed
+
+    with quizmaster.app.app_context():
+        quizmaster.db.create_all()
+        quizmaster.migrate_database()
+        seed(quizmaster, questions=20, users=50, attempts=20)
+    client = quizmaster.app.test_client()
+    client.post("/login", data={"email": "student1@example.com", "password": "password"})
+    client.get("/start_quiz/1")
+    per_request_ms(client, 200)
+
+    # Alternate a few rounds each way; the machine's noise is larger than the effect
+    instrumented, bare = [], []
+    for _ in range(3):
+        instrumented.append(per_request_ms(client, args.requests))
+        detach(quizmaster)
+        bare.append(per_request_ms(client, args.requests))
+        quizmaster.app.before_request_funcs[None].append(quizmaster.start_request_metrics)
+        quizmaster.app.after_request_funcs[None].append(quizmaster.record_request_metrics)
+        event.listen(Engine, "before_cursor_execute", quizmaster.start_sql_timer)
+        event.listen(Engine, "after_cursor_execute", quizmaster.stop_sql_timer)
+        before_render_template.connect(quizmaster.start_template_timer, quizmaster.app)
+        template_rendered.connect(quizmaster.stop_template_timer, quizmaster.app)
+    report = {
+        "requests": args.requests,
+        "instrumented_ms": round(min(instrumented), 3),
+        "bare_ms": round(min(bare), 3),
+        "overhead_ms": round(min(instrumented) - min(bare), 3),
+        "metrics_bytes": len(client.get("/metrics").data),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
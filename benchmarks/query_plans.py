@@ -0,0 +1,83 @@
+# Query-plan check: drives the main routes against a seeded scratch database, runs
+# EXPLAIN QUERY PLAN on every SELECT they issue and fails when one of them scans a
+# table that is supposed to be reached through an index.
+#
+#   python benchmarks/query_plans.py
+import os
+import sys
+import tempfile
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Tables that grow with usage; any plan step that scans them without an index is a failure.
+# Small catalog tables may still be listed in full by dashboards.
+INDEXED_TABLES = ("scores", "questions", "leaderboard", "leaderboard_points")
+FILTERED_TABLES = ("quizzes", "chapters")
+
+
+def full_scans(plan, statement):
+    for detail in plan:
+        words = detail.split()
+        if len(words) < 2 or words[0] != "SCAN" or "USING" in words:
+            continue
+        table = words[1]
+        if table in INDEXED_TABLES or (table in FILTERED_TABLES and " WHERE " in statement):
+            yield detail
+
+
+def main():
+    workdir = tempfile.mkdtemp(prefix="quizmaster-plans-")
+    os.environ["QUIZMASTER_DATABASE_URI"] = "sqlite:///" + os.path.join(workdir, "plans.sqlite3")
+    sys.path.insert(0, os.path.dirname(ROOT))
+    sys.path.insert(0, ROOT)
+    import app as quizmaster
+    from seed import seed
+
+    app, db = quizmaster.app, quizmaster.db
+    with app.app_context():
+        db.create_all()
+        quizmaster.migrate_database()
+        quizmaster.create_admin()
+        seed(quizmaster)
+
+    captured = []
+
+    @event.listens_for(Engine, "before_cursor_execute")
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            captured.append((statement, parameters))
+
+    student = app.test_client()
+    student.post("/login", data={"email": "student1@example.com", "password": "password"})
+    admin = app.test_client()
+    admin.post("/login", data={"email": "admin@gmail.com", "password": "0000"})
+    routes = [
+        (student, "/user"), (student, "/start_quiz/1"), (student, "/quiz/1"),
+        (student, "/user/history"), (student, "/quiz_scores"),
+        (student, "/leaderboard/quiz/1"), (student, "/leaderboard/subject/1"),
+        (admin, "/admin"), (admin, "/admin/summary"), (admin, "/view_subjects/1"),
+        (admin, "/view_chapter/1"), (admin, "/view_quiz/1"), (admin, "/admin/search?query=Quiz"),
+    ]
+    failures = []
+    with app.app_context():
+        for client, path in routes:
+            captured.clear()
+            client.get(path)
+            for statement, parameters in list(captured):
+                rows = db.session.connection().exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)
+                plan = [row[-1] for row in rows]
+                for detail in full_scans(plan, statement):
+                    failures.append(f"{path}: {detail}\n    {' '.join(statement.split())}")
+            captured.clear()
+
+    for failure in failures:
+        print("FULL SCAN", failure)
+    print(f"checked {len(routes)} routes, {len(failures)} full table scans")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
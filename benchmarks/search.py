@@ -0,0 +1,68 @@
+# Admin search benchmark: seeds a large catalog (1M questions and 100k users by default),
+# then times the FTS5-backed search() against the LIKE '%q%' scans it replaced.
+#
+#   python benchmarks/search.py --questions 1000000 --users 100000
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+QUERIES = ["algebra", "matrix vector", "Student 4242", "Quiz 17", "protocol kernel", "chapter", "gravity"]
+
+
+def timed(fn, repeat=3):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--questions", type=int, default=1000000)
+    parser.add_argument("--users", type=int, default=100000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="quizmaster-search-")
+    os.environ["QUIZMASTER_DATABASE_URI"] = "sqlite:///" + os.path.join(workdir, "search.sqlite3")
+    sys.path.insert(0, os.path.dirname(ROOT))
+    sys.path.insert(0, ROOT)
+    import app as quizmaster
+    from seed import seed
+
+    m, db = quizmaster, quizmaster.db
+    report = {"questions": args.questions, "users": args.users, "queries": {}}
+    with m.app.app_context():
+        db.create_all()
+        m.migrate_database()
+        start = time.perf_counter()
+        seed(m, subjects=10, chapters=10, quizzes=10, questions=max(args.questions // 1000, 1),
+             users=args.users, attempts=0)
+        report["seed_seconds"] = time.perf_counter() - start
+
+        def like_names(text):
+            pattern = f"%{text}%"
+            for model in (m.Users, m.Subjects, m.Chapters, m.Quizzes):
+                model.query.filter(model.name.ilike(pattern)).all()
+
+        def like_with_questions(text):
+            like_names(text)
+            m.Questions.query.filter(m.Questions.question_text.ilike(f"%{text}%")).limit(20).all()
+
+        for text in QUERIES:
+            report["queries"][text] = {
+                "fts_page_ms": timed(lambda: m.search(text)),
+                "like_names_ms": timed(lambda: like_names(text)),
+                "like_names_and_questions_ms": timed(lambda: like_with_questions(text)),
+            }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# Synthetic data for benchmarks: seeds Subjects/Chapters/Quizzes/Questions/Users/Scores
+# with Core bulk inserts so large catalogs load in seconds. Run directly to build a database
+# file at a given scale, e.g. for benchmarks/load.py:
+#
+#   python benchmarks/seed.py --db /tmp/load.sqlite3 --subjects 10 --users 5000 --attempts 20
+import argparse
+import json
+import os
+import random
+import sys
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import insert
+
+WORDS = ("algebra geometry calculus matrix vector integral derivative limit series probability "
+         "statistics variance median graph tree network protocol compiler kernel memory cache "
+         "thread process queue stack array pointer function recursion sorting search hashing "
+         "energy momentum force velocity acceleration gravity electron photon atom molecule "
+         "reaction enzyme protein cell genome evolution climate ocean river mountain history").split()
+
+
+def seed(quizmaster, subjects=3, chapters=3, quizzes=3, questions=5, users=10, attempts=5, seed_value=0):
+    # chapters/quizzes/questions are per parent; attempts is per user. Returns the created counts.
+    m, db = quizmaster, quizmaster.db
+    rng = random.Random(seed_value)
+    quiz_day = date.today() + timedelta(days=30)
+
+    db.session.execute(insert(m.Subjects), [
+        {"id": s + 1, "name": f"Subject {s + 1}", "description": "Synthetic subject"}
+        for s in range(subjects)])
+    db.session.execute(insert(m.Chapters), [
+        {"id": c + 1, "name": f"Chapter {c + 1}", "description": "Synthetic chapter", "subject_id": c // chapters + 1}
+        for c in range(subjects * chapters)])
+    quiz_count = subjects * chapters * quizzes
+    db.session.execute(insert(m.Quizzes), [
+        {"id": q + 1, "name": f"Quiz {q + 1}", "date_of_quiz": quiz_day, "time_duration": 30,
+         "remarks": "Synthetic quiz", "chapter_id": q // quizzes + 1}
+        for q in range(quiz_count)])
+    batch = []
+    for q in range(quiz_count * questions):
+        batch.append({"question_text": f"Question {q + 1}: " + " ".join(rng.sample(WORDS, 4)) + "?", "option_1": "A", "option_2": "B",
+                      "option_3": "C", "option_4": "D", "correct_answer": rng.randint(1, 4),
+                      "quiz_id": q // questions + 1})
+        if len(batch) == 10000:
+            db.session.execute(insert(m.Questions), batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(m.Questions), batch)
+
+    # every student signs in with "password"; one hash is shared, scrypt per user would dominate seeding
+    password = m.hash_password("password")
+    db.session.execute(insert(m.Users), [
+        {"name": f"Student {u + 1}", "email": f"student{u + 1}@example.com", "password": password,
+         "qualification": "Synthetic", "dob": date(2000, 1, 1), "is_admin": False}
+        for u in range(users)])
+    first_user = db.session.query(db.func.min(m.Users.id)).filter(m.Users.is_admin.is_(False)).scalar()
+    start = datetime.now() - timedelta(days=365)
+    batch = []
+    for a in range(users * attempts):
+        score = rng.randint(0, questions)
+        batch.append({"user_id": first_user + a // attempts, "quiz_id": rng.randint(1, quiz_count),
+                      "score": score, "total_scored": questions,
+                      "timestamp": start + timedelta(minutes=rng.randint(0, 525600))})
+        if len(batch) == 10000:
+            db.session.execute(insert(m.Scores), batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(m.Scores), batch)
+    db.session.commit()
+    return {"subjects": subjects, "quizzes": quiz_count, "questions": quiz_count * questions,
+            "users": users, "scores": users * attempts}
+
+
+def create_database(db_path, **counts):
+    # Fresh database file with the admin account and the seeded catalog; returns the counts
+    os.environ["QUIZMASTER_DATABASE_URI"] = "sqlite:///" + os.path.abspath(db_path)
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import app as quizmaster
+    with quizmaster.setup_app().app_context():
+        return seed(quizmaster, **counts)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", required=True)
+    for name, default in (("subjects", 3), ("chapters", 3), ("quizzes", 3), ("questions", 5),
+                          ("users", 10), ("attempts", 5), ("seed-value", 0)):
+        parser.add_argument(f"--{name}", type=int, default=default)
+    args = parser.parse_args()
+    if os.path.exists(args.db):
+        parser.error(f"{args.db} already exists")
+    counts = vars(args)
+    print(json.dumps(create_database(counts.pop("db"), **counts), indent=2))
+
+
+if __name__ == "__main__":
+    main()
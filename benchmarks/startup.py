@@ -0,0 +1,71 @@
+# Startup benchmark: import time and resident memory of a freshly started app process.
+# Each run happens in a clean interpreter so earlier imports cannot hide the cost.
+#
+#   python benchmarks/startup.py --runs 5 --max-import-ms 800 --max-rss-mb 120
+#
+# Prints a JSON report and exits non-zero when a threshold is exceeded, so CI can gate on it.
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r"""
+import json, sys, time
+t0 = time.perf_counter()
+import app
+import_ms = (time.perf_counter() - t0) * 1000
+client = app.app.test_client()
+client.get('/login')
+rss_kb = 0
+with open('/proc/self/status') as status:
+    for line in status:
+        if line.startswith('VmRSS:'):
+            rss_kb = int(line.split()[1])
+print(json.dumps({
+    "import_ms": import_ms,
+    "rss_mb": rss_kb / 1024,
+    "plotting_loaded": any(name in sys.modules for name in ("matplotlib", "seaborn")),
+}))
+"""
+
+
+def probe():
+    output = subprocess.run([sys.executable, "-c", PROBE], cwd=ROOT, check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-import-ms", type=float, default=None)
+    parser.add_argument("--max-rss-mb", type=float, default=None)
+    args = parser.parse_args()
+
+    samples = [probe() for _ in range(args.runs)]
+    report = {
+        "runs": args.runs,
+        "import_ms_median": statistics.median(s["import_ms"] for s in samples),
+        "rss_mb_median": statistics.median(s["rss_mb"] for s in samples),
+        "plotting_loaded": any(s["plotting_loaded"] for s in samples),
+    }
+    print(json.dumps(report, indent=2))
+
+    failures = []
+    if report["plotting_loaded"]:
+        failures.append("matplotlib/seaborn imported at startup")
+    if args.max_import_ms is not None and report["import_ms_median"] > args.max_import_ms:
+        failures.append(f"import took {report['import_ms_median']:.0f} ms (max {args.max_import_ms})")
+    if args.max_rss_mb is not None and report["rss_mb_median"] > args.max_rss_mb:
+        failures.append(f"RSS {report['rss_mb_median']:.1f} MB (max {args.max_rss_mb})")
+    for failure in failures:
+        print("FAIL:", failure, file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
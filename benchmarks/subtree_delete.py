@@ -0,0 +1,71 @@
+# Subject delete benchmark: seeds one subject with a long score history, then deletes it either
+# the old way (every descendant loaded into the session and deleted one object at a time) or
+# through delete_subtree() and the ON DELETE CASCADE foreign keys. Each mode runs in its own
+# process so the peak RSS numbers are comparable.
+#
+#   python benchmarks/subtree_delete.py --scores 200000
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def run(mode, scores):
+    workdir = tempfile.mkdtemp(prefix="quizmaster-delete-")
+    os.environ["QUIZMASTER_DATABASE_URI"] = "sqlite:///" + os.path.join(workdir, "delete.sqlite3")
+    sys.path.insert(0, os.path.dirname(ROOT))
+    sys.path.insert(0, ROOT)
+    import app as quizmaster
+    from seed import seed
+
+    m, db = quizmaster, quizmaster.db
+    users = max(scores // 100, 1)
+    with m.app.app_context():
+        db.create_all()
+        m.migrate_database()
+        seed(m, subjects=1, chapters=10, quizzes=10, questions=10, users=users, attempts=scores // users)
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start = time.perf_counter()
+        if mode == "orm":
+            subject = db.session.get(m.Subjects, 1)
+            for chapter in subject.chapters:
+                for quiz in chapter.quizzes:
+                    for child in list(quiz.scores) + list(quiz.questions):
+                        db.session.delete(child)
+                    db.session.delete(quiz)
+                db.session.delete(chapter)
+            db.session.delete(subject)
+            db.session.commit()
+        else:
+            m.app.config["BACKGROUND_DELETE_THRESHOLD"] = scores
+            m.delete_subtree("subject", 1)
+        elapsed = time.perf_counter() - start
+        left = db.session.query(m.Scores).count()
+    return {"mode": mode, "seconds": round(elapsed, 2), "scores_left": left,
+            "peak_rss_growth_mb": round((resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) / 1024, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scores", type=int, default=200000)
+    parser.add_argument("--mode", choices=["orm", "cascade"])
+    args = parser.parse_args()
+    if args.mode:
+        print(json.dumps(run(args.mode, args.scores)))
+        return
+    report = {"scores": args.scores}
+    for mode in ("orm", "cascade"):
+        output = subprocess.run([sys.executable, __file__, "--mode", mode, "--scores", str(args.scores)],
+                                check=True, capture_output=True, text=True).stdout
+        report[mode] = json.loads(output.strip().splitlines()[-1])
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
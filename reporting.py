@@ -0,0 +1,177 @@
+# Reporting helpers for the admin summary charts, the cohort report and the item statistics job.
+# The NumPy aggregations are all most callers need: matplotlib (and seaborn when available) are
+# only imported by render_chart, so app.py can load this module from the background stats job
+# without pulling in the plotting stack.
+import io
+
+import numpy as np
+
+
+def render_chart(name, rows):
+    from matplotlib.figure import Figure
+    try:
+        import seaborn as sns
+    except ImportError:  # seaborn only styles the bar chart, plain matplotlib is enough
+        sns = None
+
+    # Each render owns its Figure, so nothing is shared through pyplot's global state
+    labels = [row[0] for row in rows]
+    values = [row[1] for row in rows]
+    fig = Figure(figsize=(6,4))
+    ax = fig.subplots()
+    if name == "quizzes_per_subject":
+        if sns is not None:
+            sns.barplot(x=labels, y=values, ax=ax)
+        else:
+            ax.bar(labels, values)
+        ax.set_title("Quiz per subject")
+        ax.set_xlabel("Subjects name")
+        ax.set_ylabel("No of quizzes")
+    else:
+        if values:
+            ax.pie(values, labels=labels, autopct='%1.1f%%', shadow=True, startangle=90)
+        ax.set_title("User attempts per subject")
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png")
+    return buffer.getvalue()
+
+
+# Cohort analytics over the whole scores table. Scores are read in id ranges, each range
+# as one group_concat string of packed integers that NumPy parses in C; that is several times
+# faster than fetching row tuples through the sqlite3 module. From there every statistic is a
+# bincount, cumsum or lexsort over the column arrays, with no per-row Python work.
+
+PERCENTILES = (10, 25, 50, 75, 90)
+LOAD_CHUNK = 500000
+LOAD_SQL = ("SELECT group_concat(((user_id << 32) | quiz_id) || ',' || ((score << 32) | total_scored)) "
+            "FROM scores WHERE id >= ? AND id < ?")
+
+
+def load_scores(conn):
+    # conn is a SQLAlchemy Connection; returns {"user_id", "quiz_id", "score", "total"} arrays
+    cursor = conn.connection.driver_connection.cursor()
+    low, high = cursor.execute("SELECT min(id), max(id) FROM scores").fetchone()
+    chunks = []
+    for start in range(low or 0, (high or -1) + 1, LOAD_CHUNK):
+        packed = cursor.execute(LOAD_SQL, (start, start + LOAD_CHUNK)).fetchone()[0]
+        if packed:
+            chunks.append(np.fromstring(packed, sep=",", dtype=np.int64))
+    packed = np.concatenate(chunks).reshape(-1, 2) if chunks else np.empty((0, 2), dtype=np.int64)
+    low_bits = np.int64(0xFFFFFFFF)
+    return {"user_id": packed[:, 0] >> 32, "quiz_id": packed[:, 0] & low_bits,
+            "score": packed[:, 1] >> 32, "total": packed[:, 1] & low_bits}
+
+
+def lookup(conn, sql):
+    # (id, value) rows -> array indexed by id, for mapping quiz ids to subjects and the like
+    rows = conn.exec_driver_sql(sql).all()
+    size = max((row[0] for row in rows), default=0) + 1
+    table = np.zeros(size, dtype=np.int64)
+    for key, value in rows:
+        table[key] = value
+    return table
+
+
+def names(conn, table, ids):
+    ids = [int(i) for i in ids]
+    if not ids:
+        return {}
+    marks = ",".join("?" * len(ids))
+    return dict(conn.exec_driver_sql(f"SELECT id, name FROM {table} WHERE id IN ({marks})", tuple(ids)).all())
+
+
+def grouped_percentiles(groups, values, size, resolution=1000):
+    # Percentiles of integer values in [0, resolution] per group, read off a per-group
+    # histogram instead of sorting: O(rows + groups * resolution). Matches
+    # numpy.percentile(method="inverted_cdf") on values rounded to the resolution.
+    counts = np.bincount(groups * (resolution + 1) + values, minlength=size * (resolution + 1))
+    cumulative = counts.reshape(size, resolution + 1).cumsum(axis=1)
+    totals = cumulative[:, -1]
+    result = np.zeros((size, len(PERCENTILES)))
+    for column, p in enumerate(PERCENTILES):
+        rank = np.ceil(totals * p / 100.0).clip(min=1)
+        # first bin whose running count reaches the rank, for every group at once
+        result[:, column] = (cumulative < rank[:, None]).sum(axis=1)
+    return result * (100.0 / resolution), totals
+
+
+def cohort_report(conn, top=20):
+    scores = load_scores(conn)
+    quiz_subject = lookup(conn, "SELECT quizzes.id, chapters.subject_id FROM quizzes JOIN chapters ON chapters.id = quizzes.chapter_id")
+    quiz_questions = lookup(conn, "SELECT quiz_id, count(*) FROM questions GROUP BY quiz_id")
+    user_id, quiz_id = scores["user_id"], scores["quiz_id"]
+    score, total = scores["score"], scores["total"]
+    report = {"scores": int(len(score))}
+    if not len(score):
+        report.update(quizzes=[], subjects=[], distribution=[0] * 10, users=[])
+        return report
+
+    # Quizzes whose chapter is gone have no subject; they fall into group 0
+    quiz_subject = np.concatenate([quiz_subject, np.zeros(max(quiz_id.max() + 1 - len(quiz_subject), 0), dtype=np.int64)])
+    subject_id = quiz_subject[quiz_id]
+    ratio = np.divide(score, total, out=np.zeros(len(score)), where=total > 0)
+    per_mille = np.rint(ratio * 1000).astype(np.int64).clip(0, 1000)
+    bucket = np.minimum(per_mille // 100, 9)
+
+    # Per-quiz difficulty: share of answers that were wrong, hardest first
+    quiz_attempts = np.bincount(quiz_id)
+    quiz_correct = np.bincount(quiz_id, weights=score)
+    quiz_possible = np.bincount(quiz_id, weights=total)
+    taken = np.flatnonzero(quiz_attempts)
+    difficulty = 1 - np.divide(quiz_correct[taken], quiz_possible[taken], out=np.zeros(len(taken)), where=quiz_possible[taken] > 0)
+    hardest = taken[np.argsort(-difficulty, kind="stable")][:top]
+    quiz_names = names(conn, "quizzes", hardest)
+    order = {quiz: index for index, quiz in enumerate(taken)}
+    report["quizzes"] = [{
+        "quiz_id": int(quiz), "name": quiz_names.get(int(quiz)), "attempts": int(quiz_attempts[quiz]),
+        "questions": int(quiz_questions[quiz]) if quiz < len(quiz_questions) else 0,
+        "difficulty": round(float(difficulty[order[quiz]]), 4),
+    } for quiz in hardest]
+
+    # Per-subject percentiles and score distribution (same ten buckets as quiz_score_buckets)
+    subject_count = int(subject_id.max()) + 1
+    percentiles, attempts = grouped_percentiles(subject_id, per_mille, subject_count)
+    distribution = np.bincount(subject_id * 10 + bucket, minlength=subject_count * 10).reshape(subject_count, 10)
+    ratio_sum = np.bincount(subject_id, weights=ratio, minlength=subject_count)
+    subjects = np.flatnonzero(attempts)
+    subject_names = names(conn, "subjects", subjects)
+    report["subjects"] = [{
+        "subject_id": int(subject), "name": subject_names.get(int(subject)), "attempts": int(attempts[subject]),
+        "mean": round(float(ratio_sum[subject] / attempts[subject] * 100), 2),
+        "percentiles": {f"p{p}": round(float(value), 1) for p, value in zip(PERCENTILES, percentiles[subject])},
+        "distribution": distribution[subject].tolist(),
+    } for subject in subjects]
+    report["distribution"] = distribution.sum(axis=0).tolist()
+
+    # User rankings by total correct answers, then by percentage
+    user_correct = np.bincount(user_id, weights=score)
+    user_possible = np.bincount(user_id, weights=total)
+    user_attempts = np.bincount(user_id)
+    active = np.flatnonzero(user_attempts)
+    percentage = np.divide(user_correct[active], user_possible[active], out=np.zeros(len(active)), where=user_possible[active] > 0)
+    ranking = np.lexsort((-percentage, -user_correct[active]))
+    leaders = active[ranking[:top]]
+    user_names = names(conn, "users", leaders)
+    report["users"] = [{
+        "rank": rank + 1, "user_id": int(user), "name": user_names.get(int(user)),
+        "attempts": int(user_attempts[user]), "total_correct": int(user_correct[user]),
+        "percentage": round(float(percentage[ranking[rank]] * 100), 2),
+    } for rank, user in enumerate(leaders)]
+    return report
+
+
+def option_counts(rows):
+    # (layout id, packed answers) rows -> {layout id: (questions, 5) array counting, per question,
+    # unanswered (column 0) and each option 1-4}. Attempts sharing a layout are one byte matrix.
+    by_layout = {}
+    for layout_id, answers in rows:
+        by_layout.setdefault(layout_id, []).append(answers)
+    counts = {}
+    for layout_id, blobs in by_layout.items():
+        width = len(blobs[0])
+        if not width:
+            continue
+        matrix = np.frombuffer(b"".join(blobs), dtype=np.uint8).reshape(-1, width)
+        cells = np.arange(width) * 5 + np.minimum(matrix, 4)
+        counts[layout_id] = np.bincount(cells.ravel(), minlength=width * 5).reshape(width, 5)
+    return counts